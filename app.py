@@ -4,14 +4,25 @@ Sistema Polímata com Visual ChatGPT, Perfis e Persistência Híbrida.
 """
 import chainlit as cl
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from chainlit.server import app as servidor_chainlit
 from sqlalchemy import create_engine
-from voz import transcrever, falar
+from voz import transcrever, falar_texto_longo, mime_do_formato
 from cerebro import pensar, obter_system_prompt
-from database import SessionLocal, init_db, criar_perfis_padrao, get_db
+from conversa import Conversa
+from database import SessionLocal, init_db, criar_perfis_padrao, get_db, atualizar_resumo_thread
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.exc import IntegrityError
 from models import ChatProfile, Message
+from uso import registro_uso
+from memoria import obter_memoria
+from saude import registrar_rotas, iniciar_aquecimento
+from multiagente import consultar_em_paralelo, CONSULTOR_FANOUT
+from exportacao import registrar_rotas as registrar_rotas_admin
 import os
+import time
 import asyncio
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -132,6 +143,34 @@ try:
 except:
     pass
 
+# Memória de longo prazo: com ela ativa, só as últimas mensagens da sessão vão
+# no prompt e o resto vem das lembranças recuperadas (da própria thread e, com
+# login, das outras threads do mesmo usuário). Desligada por padrão
+MEMORIA_ATIVA = os.getenv("MEMORIA_ATIVA", "0") == "1"
+HISTORICO_MAX_MENSAGENS = max(2, int(os.getenv("HISTORICO_MAX_MENSAGENS", "12")))
+
+
+def sincronizar_memoria():
+    """Indexa mensagens ainda não vistas pela memória (seguro chamar de qualquer thread)."""
+    try:
+        novas = obter_memoria().sincronizar()
+        if novas:
+            print(f"🧩 Memória: {novas} mensagens indexadas")
+    except Exception as e:
+        print(f"⚠️ Erro ao sincronizar memória: {e}")
+
+
+if MEMORIA_ATIVA:
+    # Indexa o histórico existente em background para não atrasar o boot
+    threading.Thread(target=sincronizar_memoria, name="memoria-sync", daemon=True).start()
+
+# Aquecimento (banco, LLM, voz) no boot e periodicamente + /healthz e /readyz
+registrar_rotas(servidor_chainlit)
+iniciar_aquecimento()
+
+# Exportação NDJSON das conversas (/admin/exportar, protegida por ADMIN_TOKEN)
+registrar_rotas_admin(servidor_chainlit)
+
 # ============================================================================
 # 2. PERFIS DE CHAT (MENU INICIAL)
 # ============================================================================
@@ -203,7 +242,7 @@ async def start():
     system_prompt = obter_system_prompt(perfil_nome)
     cl.user_session.set("perfil", perfil_nome)
     cl.user_session.set("system_prompt", system_prompt)
-    cl.user_session.set("historico", [])
+    cl.user_session.set("historico", Conversa())
 
     # Mensagem Inicial Limpa
     msg_texto = f"**GaMi-AI Ativado.**\nModo: `{perfil_nome}`"
@@ -225,19 +264,24 @@ async def on_audio_end(audio: cl.Audio):
     # Processa Voz
     await cl.Message(content="👂 Ouvindo...", type="info").send()
     
+    metricas = {}
     try:
         # Executa transcrição em thread separada
+        inicio_stt = time.perf_counter()
         # Tenta usar asyncio.to_thread se disponível (Python 3.9+), senão usa loop.run_in_executor
         try:
-            texto = await asyncio.to_thread(transcrever, audio.path)
+            texto = await asyncio.to_thread(transcrever, audio.path, metricas)
         except AttributeError:
             # Fallback para Python < 3.9
             loop = asyncio.get_event_loop()
-            texto = await loop.run_in_executor(None, transcrever, audio.path)
+            texto = await loop.run_in_executor(None, transcrever, audio.path, metricas)
+        metricas["latency_stt_ms"] = int((time.perf_counter() - inicio_stt) * 1000)
         
         if texto and texto.strip():
+            # Quem fala com o GaMi passa a receber respostas em voz automaticamente
+            cl.user_session.set("modo_voz", True)
             await cl.Message(content=f"🗣️ **Você:** {texto}").send()
-            await processar_interacao(texto, responder_com_audio=True)
+            await processar_interacao(texto, responder_com_audio=True, metricas=metricas)
         else:
             await cl.Message(content="⚠️ Não entendi o áudio.", type="warning").send()
     except Exception as e:
@@ -247,32 +291,60 @@ async def on_audio_end(audio: cl.Audio):
 # 4. PROCESSAMENTO CENTRAL (CÉREBRO + VOZ)
 # ============================================================================
 
-async def processar_interacao(texto_usuario, responder_com_audio=False):
+async def processar_interacao(texto_usuario, responder_com_audio=False, metricas=None):
     try:
         # Validação
         if not texto_usuario or not texto_usuario.strip():
             return
         
+        # Métricas do turno (ledger de uso); a transcrição já pode ter preenchido o STT
+        inicio_turno = time.perf_counter()
+        metricas = metricas if metricas is not None else {}
+        
         # Recupera contexto
         system_prompt = cl.user_session.get("system_prompt")
         if not system_prompt:
             perfil = cl.user_session.get("perfil", "modo_geral")
             system_prompt = obter_system_prompt(perfil)
         
-        historico = cl.user_session.get("historico", [])
+        historico = cl.user_session.get("historico")
+        if not isinstance(historico, Conversa):
+            historico = Conversa.de_dicts(historico)
+        
+        # Memória de longo prazo: lembranças de outras threads + janela curta da sessão
+        contexto = None
+        historico_prompt = historico
+        if MEMORIA_ATIVA:
+            contexto = await buscar_memoria(
+                texto_usuario, cl.user_session.get("thread_id"), dono_da_sessao(), HISTORICO_MAX_MENSAGENS
+            )
+            historico_prompt = historico[-HISTORICO_MAX_MENSAGENS:]
         
         # 1. Pensar
         msg_pensando = await cl.Message(content="🧠 Pensando...", type="info").send()
         
+        # Modo Consultor pode usar análises paralelas (mercado, riscos, operações) + síntese
+        usar_fanout = CONSULTOR_FANOUT and cl.user_session.get("perfil") == "modo_consultor"
+        
         # Executa pensamento em thread separada para não bloquear
         try:
-            # Tenta usar asyncio.to_thread se disponível (Python 3.9+), senão usa loop.run_in_executor
-            try:
-                resposta = await asyncio.to_thread(pensar, texto_usuario, system_prompt, historico)
-            except AttributeError:
-                # Fallback para Python < 3.9
-                loop = asyncio.get_event_loop()
-                resposta = await loop.run_in_executor(None, lambda: pensar(texto_usuario, system_prompt, historico))
+            if usar_fanout:
+                resultado = await executar_em_thread(
+                    consultar_em_paralelo, texto_usuario, historico_prompt, metricas=metricas, contexto=contexto
+                )
+                resposta = resultado["resposta"]
+            else:
+                # Tenta usar asyncio.to_thread se disponível (Python 3.9+), senão usa loop.run_in_executor
+                try:
+                    resposta = await asyncio.to_thread(
+                        pensar, texto_usuario, system_prompt, historico_prompt, metricas, contexto
+                    )
+                except AttributeError:
+                    # Fallback para Python < 3.9
+                    loop = asyncio.get_event_loop()
+                    resposta = await loop.run_in_executor(
+                        None, lambda: pensar(texto_usuario, system_prompt, historico_prompt, metricas, contexto)
+                    )
             
             # Valida se a resposta foi gerada
             if not resposta or not resposta.strip():
@@ -324,8 +396,7 @@ async def processar_interacao(texto_usuario, responder_com_audio=False):
             return
         
         # 2. Atualizar Memória Local
-        historico.append({"role": "user", "content": texto_usuario})
-        historico.append({"role": "assistant", "content": resposta})
+        historico.adicionar_turno(texto_usuario, resposta)
         cl.user_session.set("historico", historico)
         
         # 3. Salvar no Banco Customizado (Backup) - Executa em background sem bloquear
@@ -336,13 +407,16 @@ async def processar_interacao(texto_usuario, responder_com_audio=False):
             cl.user_session.set("thread_id", thread_id)
         
         perfil = cl.user_session.get("perfil", "modo_geral")
+        dono = dono_da_sessao()
         if thread_id:
             # Executa backup em background sem bloquear (não aguarda)
             def fazer_backup():
                 try:
-                    salvar_db_backup(thread_id, perfil, texto_usuario, resposta)
+                    salvar_db_backup(thread_id, perfil, texto_usuario, resposta, dono)
                 except Exception as e:
                     print(f"⚠️ Erro backup DB: {e}")
+                if MEMORIA_ATIVA:
+                    sincronizar_memoria()
             
             # Executa em background sem bloquear a resposta
             try:
@@ -351,27 +425,31 @@ async def processar_interacao(texto_usuario, responder_com_audio=False):
             except Exception as e:
                 print(f"⚠️ Erro ao agendar backup: {e}")
 
-        # 4. Responder (Texto)
-        await cl.Message(content=resposta).send()
+        # 4. Responder (Texto) - sai imediatamente, sem esperar pela voz
+        falar_agora = responder_com_audio or cl.user_session.get("modo_voz", False)
+        msg_resposta = cl.Message(content=resposta)
+        if not falar_agora:
+            # Sessões só de texto: a fala é sintetizada apenas se o usuário pedir.
+            # O texto fica no servidor; o botão leva só o id da mensagem
+            guardar_resposta_para_ouvir(msg_resposta.id, resposta)
+            msg_resposta.actions = [cl.Action(
+                name="ouvir_resposta",
+                payload={"mensagem_id": msg_resposta.id},
+                label="🔊 Ouvir",
+            )]
+        await msg_resposta.send()
+        metricas.update(
+            thread_id=thread_id,
+            perfil=perfil,
+            latency_total_ms=int((time.perf_counter() - inicio_turno) * 1000),
+        )
         
-        # 5. Responder (Áudio - Se solicitado ou automático)
-        if responder_com_audio or True: 
-            if len(resposta) < 800:  # Evita ler textos gigantes
-                try:
-                    # Executa geração de áudio em thread separada
-                    # Tenta usar asyncio.to_thread se disponível (Python 3.9+), senão usa loop.run_in_executor
-                    try:
-                        audio_path = await asyncio.to_thread(falar, resposta)
-                    except AttributeError:
-                        # Fallback para Python < 3.9
-                        loop = asyncio.get_event_loop()
-                        audio_path = await loop.run_in_executor(None, falar, resposta)
-                    
-                    if audio_path:
-                        el_audio = cl.Audio(path=audio_path, name="voz")
-                        await cl.Message(content="", elements=[el_audio]).send()
-                except Exception as e:
-                    print(f"⚠️ Erro ao gerar áudio: {e}")
+        # 5. Responder (Áudio) - gerado em background e anexado quando pronto
+        if falar_agora:
+            # O turno é registrado no ledger quando a fala terminar
+            agendar_audio(resposta, msg_resposta, metricas)
+        else:
+            registro_uso.registrar(metricas)
 
     except Exception as e:
         import traceback
@@ -382,9 +460,135 @@ async def processar_interacao(texto_usuario, responder_com_audio=False):
             type="error"
         ).send()
 
-def salvar_db_backup(tid, perfil, user_txt, ai_txt):
+async def executar_em_thread(func, *args, **kwargs):
+    """Executa uma função bloqueante fora do event loop."""
+    # Tenta usar asyncio.to_thread se disponível (Python 3.9+), senão usa loop.run_in_executor
+    try:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    except AttributeError:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+def dono_da_sessao():
+    """Identificador do usuário autenticado (None quando o app roda sem login)."""
+    usuario = cl.user_session.get("user")
+    return getattr(usuario, "identifier", None)
+
+
+async def buscar_memoria(texto, thread_id, dono, janela):
+    """Recupera o bloco de lembranças relevantes; falhas nunca bloqueiam a resposta."""
+    try:
+        return await executar_em_thread(obter_memoria().contexto_para, texto, thread_id, dono, janela)
+    except Exception as e:
+        print(f"⚠️ Erro ao buscar memória: {e}")
+        return None
+
+
+def criar_elementos_audio(audio: bytes, formato: str, auto_play=True):
+    """
+    Monta o elemento de áudio a partir dos bytes sintetizados.
+    
+    Os bytes vão direto para o `cl.Audio(content=...)`, sem o arquivo
+    intermediário em `audio/` (gravado e relido antes). O Chainlit ainda
+    persiste o conteúdo do elemento em `.files/<sessão>/` ao enviá-lo, de
+    onde o navegador o baixa; esses arquivos são removidos com a sessão.
+    
+    Respostas longas já chegam emendadas em um único áudio, que toca inteiro.
+    """
+    return [cl.Audio(
+        content=audio,
+        mime=mime_do_formato(formato),
+        name=f"voz.{formato}",
+        auto_play=auto_play,
+    )]
+
+
+async def anexar_audio(texto, msg_resposta, metricas, auto_play=True):
+    """
+    Gera a fala de `texto` e anexa o áudio à mensagem de resposta já enviada.
+    Ao final, registra o turno (com os dados da fala) no ledger de uso.
+    """
+    try:
+        inicio_tts = time.perf_counter()
+        audio, formato = await executar_em_thread(falar_texto_longo, texto, metricas=metricas)
+        metricas["latency_tts_ms"] = int((time.perf_counter() - inicio_tts) * 1000)
+        if audio:
+            msg_resposta.elements.extend(criar_elementos_audio(audio, formato, auto_play))
+            await msg_resposta.update()
+    except Exception as e:
+        print(f"⚠️ Erro ao gerar áudio: {e}")
+    finally:
+        registro_uso.registrar(metricas)
+
+
+def agendar_audio(texto, msg_resposta, metricas):
+    """
+    Dispara a geração de áudio em background, liberando o handler para a
+    próxima mensagem do usuário enquanto a fala é sintetizada.
+    """
+    tarefas = cl.user_session.get("tarefas_audio")
+    if tarefas is None:
+        tarefas = set()
+        cl.user_session.set("tarefas_audio", tarefas)
+    # Mantém referência até terminar (o event loop só guarda referências fracas)
+    tarefa = asyncio.create_task(anexar_audio(texto, msg_resposta, metricas))
+    tarefas.add(tarefa)
+    tarefa.add_done_callback(tarefas.discard)
+
+
+# Respostas que ainda podem ser ouvidas sob demanda (as mais antigas expiram)
+RESPOSTAS_OUVIR_MAX = int(os.getenv("RESPOSTAS_OUVIR_MAX", "20"))
+
+
+def guardar_resposta_para_ouvir(mensagem_id, texto):
+    """Guarda na sessão o texto que o botão "Ouvir" da mensagem vai sintetizar."""
+    respostas = cl.user_session.get("respostas_ouvir")
+    if respostas is None:
+        respostas = {}
+        cl.user_session.set("respostas_ouvir", respostas)
+    respostas[mensagem_id] = texto
+    while len(respostas) > RESPOSTAS_OUVIR_MAX:
+        respostas.pop(next(iter(respostas)))
+
+
+@cl.action_callback("ouvir_resposta")
+async def ouvir_resposta(action: cl.Action):
+    """Sintetiza a fala sob demanda quando o usuário clica em "Ouvir"."""
+    mensagem_id = (action.payload or {}).get("mensagem_id")
+    respostas = cl.user_session.get("respostas_ouvir") or {}
+    # Só sintetiza respostas desta sessão; o pop evita gerar a mesma fala duas vezes
+    texto = respostas.pop(mensagem_id, None) if mensagem_id else None
+    if not texto:
+        await cl.Message(content="⚠️ Esta resposta não está mais disponível em áudio.", type="warning").send()
+        return
+    try:
+        await action.remove()  # Evita sintetizar a mesma resposta duas vezes
+    except Exception:
+        pass
+    metricas = {
+        "thread_id": cl.user_session.get("thread_id"),
+        "perfil": cl.user_session.get("perfil", "modo_geral"),
+    }
+    try:
+        inicio_tts = time.perf_counter()
+        audio, formato = await executar_em_thread(falar_texto_longo, texto, metricas=metricas)
+        metricas["latency_tts_ms"] = int((time.perf_counter() - inicio_tts) * 1000)
+        if audio:
+            elementos = criar_elementos_audio(audio, formato)
+            await cl.Message(content="", elements=elementos, parent_id=action.forId).send()
+    except Exception as e:
+        await cl.Message(content=f"⚠️ Erro ao gerar áudio: {str(e)}", type="warning").send()
+    finally:
+        registro_uso.registrar(metricas)
+
+
+def salvar_db_backup(tid, perfil, user_txt, ai_txt, dono=None):
     """
     Salva mensagens no banco de dados customizado (backup).
+    
+    `dono` é o usuário autenticado da sessão: a memória de longo prazo só
+    mistura threads diferentes quando elas têm o mesmo dono.
     """
     if not tid:
         return
@@ -395,9 +599,23 @@ def salvar_db_backup(tid, perfil, user_txt, ai_txt):
         p_obj = db.query(ChatProfile).filter(ChatProfile.name == perfil).first()
         pid = p_obj.id if p_obj else None
         
-        db.add(Message(thread_id=tid, profile_id=pid, role="user", content=user_txt))
-        db.add(Message(thread_id=tid, profile_id=pid, role="assistant", content=ai_txt))
-        db.commit()
+        for tentativa in range(2):
+            agora = datetime.utcnow()
+            db.add(Message(thread_id=tid, owner_id=dono, profile_id=pid, role="user", content=user_txt,
+                           created_at=agora))
+            db.add(Message(thread_id=tid, owner_id=dono, profile_id=pid, role="assistant", content=ai_txt,
+                           created_at=agora))
+            # Mantém o índice de threads (listagem de conversas) no mesmo commit
+            atualizar_resumo_thread(db, tid, pid, user_txt, novas_mensagens=2, novas_do_usuario=1,
+                                    momento=agora, dono=dono)
+            try:
+                db.commit()
+                break
+            except IntegrityError:
+                # Outro backup criou o resumo desta thread ao mesmo tempo: repete como update
+                db.rollback()
+                if tentativa:
+                    raise
     except Exception as e:
         if db:
             db.rollback()
@@ -3,8 +3,13 @@ Módulo do Cérebro - ChatOpenAI configurado para OpenRouter/Claude 3.5 Sonnet
 com System Prompt dinâmico baseado em perfis de chat
 """
 import os
+import time
+import random
+import threading
+import openai
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage
+from conversa import Conversa, montar_de_dicts
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -50,6 +55,124 @@ Adapte seu tom e profundidade técnica conforme o contexto da pergunta."""
 }
 
 
+class LimitadorTaxa:
+    """
+    Token bucket compartilhado entre todas as chamadas ao modelo do processo.
+
+    O limite vale por processo: o app (app.py) e o modo em lote (lote.py) rodam
+    em processos separados, cada um com seu balde. Para não estourar a cota do
+    provedor, a soma dos limites dos processos ativos precisa caber nela
+    (ex.: LLM_REQUISICOES_POR_MINUTO=40 no app e `lote.py --rpm 20`).
+    """
+
+    def __init__(self, requisicoes_por_minuto: float):
+        self.capacidade = max(1.0, requisicoes_por_minuto)
+        self.taxa = requisicoes_por_minuto / 60.0
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até haver uma vaga para nova requisição."""
+        if self.taxa <= 0:
+            return
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.taxa
+            time.sleep(espera)
+
+
+# Política única de limite e retry (tráfego ao vivo e lote), por processo
+LIMITADOR = LimitadorTaxa(float(os.getenv("LLM_REQUISICOES_POR_MINUTO", "60")))
+MAX_TENTATIVAS = int(os.getenv("LLM_MAX_TENTATIVAS", "3"))
+ESPERA_BASE_RETRY = float(os.getenv("LLM_ESPERA_BASE_RETRY", "1.0"))
+
+
+# Erros do SDK da OpenAI que valem nova tentativa (APITimeoutError herda de APIConnectionError)
+ERROS_TRANSITORIOS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _erro_transitorio(erro: Exception) -> bool:
+    """Indica se vale a pena repetir a chamada (rate limit, timeout, conexão, 5xx)."""
+    if isinstance(erro, ERROS_TRANSITORIOS):
+        return True
+    status = getattr(erro, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+
+class RespostaModelo:
+    """
+    Resposta de uma chamada direta ao /chat/completions, nos mesmos atributos
+    da AIMessage do LangChain usados por `pensar` e `extrair_uso`.
+    """
+
+    def __init__(self, completion):
+        uso = completion.usage
+        detalhes = getattr(uso, "prompt_tokens_details", None)
+        self.content = completion.choices[0].message.content or ""
+        self.usage_metadata = {
+            "input_tokens": uso.prompt_tokens if uso else 0,
+            "output_tokens": uso.completion_tokens if uso else 0,
+            "input_token_details": {"cache_read": getattr(detalhes, "cached_tokens", 0) or 0},
+        }
+        self.response_metadata = {"model_name": completion.model}
+
+
+def parametros_da_requisicao(llm) -> dict:
+    """Campos do corpo além das mensagens (model, temperature, ...), como o ChatOpenAI os envia."""
+    payload = llm._get_request_payload([HumanMessage(content="")])
+    payload.pop("messages", None)
+    return payload
+
+
+def _completar(llm, corpo: bytes):
+    """POST do corpo já serializado pelo cliente HTTP do próprio ChatOpenAI (mesmo pool e cabeçalhos)."""
+    from openai.types.chat import ChatCompletion
+
+    completion = llm.root_client.post(
+        "/chat/completions",
+        cast_to=ChatCompletion,
+        content=corpo,
+        options={"timeout": llm.request_timeout},
+    )
+    return RespostaModelo(completion)
+
+
+def invocar_com_politica(llm, mensagens):
+    """
+    Invoca o modelo respeitando o limitador de taxa e a política de retry.
+
+    `mensagens` é uma lista de mensagens do LangChain (`llm.invoke`) ou o corpo
+    JSON já montado por `Conversa.corpo_json` (enviado direto, sem reconverter
+    o histórico). Erros transitórios são repetidos com backoff exponencial e
+    jitter; os demais sobem imediatamente para o chamador.
+    """
+    tentativa = 0
+    while True:
+        tentativa += 1
+        LIMITADOR.adquirir()
+        try:
+            if isinstance(mensagens, bytes):
+                return _completar(llm, mensagens)
+            return llm.invoke(mensagens)
+        except Exception as e:
+            if tentativa >= MAX_TENTATIVAS or not _erro_transitorio(e):
+                raise
+            espera = ESPERA_BASE_RETRY * (2 ** (tentativa - 1)) * (1 + random.random())
+            print(f"🔄 Erro transitório ({str(e)[:80]}), tentativa {tentativa + 1} em {espera:.1f}s")
+            time.sleep(espera)
+
+
 def obter_system_prompt(perfil: str = "modo_geral") -> str:
     """
     Retorna o system prompt baseado no perfil de chat selecionado.
@@ -63,10 +186,18 @@ def obter_system_prompt(perfil: str = "modo_geral") -> str:
     return SYSTEM_PROMPTS.get(perfil, SYSTEM_PROMPTS["modo_geral"])
 
 
+# Clientes reaproveitados entre chamadas: mantém o pool HTTP (DNS/TLS já feitos)
+_LLM_CACHE = {}
+_lock_llm = threading.Lock()
+
+
 def criar_llm() -> ChatOpenAI:
     """
     Cria e configura o ChatOpenAI para usar OpenRouter com Claude 3.5 Sonnet.
     
+    A instância é criada uma vez por configuração e reaproveitada, para que
+    todas as chamadas (e o aquecimento em saude.py) usem o mesmo pool de conexões.
+    
     Returns:
         Instância configurada do ChatOpenAI
     """
@@ -89,56 +220,80 @@ def criar_llm() -> ChatOpenAI:
         if model_name not in ["gpt-4o", "gpt-4-turbo", "gpt-4", "gpt-3.5-turbo"]:
             model_name = "gpt-4o"  # Tenta gpt-4o primeiro
     
-    print(f"🔧 Usando modelo: {model_name} | Base URL: {base_url}")
+    chave = (model_name, api_key, base_url)
+    llm = _LLM_CACHE.get(chave)
+    if llm is not None:
+        return llm
     
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=api_key,
-        base_url=base_url,
-        temperature=0.7,
-        max_tokens=2000,
-        timeout=60,  # Timeout de 60 segundos
-    )
-    
-    return llm
+    with _lock_llm:
+        if chave not in _LLM_CACHE:
+            print(f"🔧 Usando modelo: {model_name} | Base URL: {base_url}")
+            _LLM_CACHE[chave] = ChatOpenAI(
+                model=model_name,
+                api_key=api_key,
+                base_url=base_url,
+                temperature=0.7,
+                max_tokens=2000,
+                timeout=60,  # Timeout de 60 segundos
+                max_retries=0,  # Retry só em invocar_com_politica (passa pelo LIMITADOR)
+            )
+        return _LLM_CACHE[chave]
+
+
+def extrair_uso(response, metricas: dict):
+    """
+    Copia para `metricas` o consumo de tokens e o modelo reportados pelo provedor.
+    """
+    uso = getattr(response, "usage_metadata", None) or {}
+    detalhes = uso.get("input_token_details") or {}
+    metricas["prompt_tokens"] = uso.get("input_tokens", 0)
+    metricas["completion_tokens"] = uso.get("output_tokens", 0)
+    metricas["cached_tokens"] = detalhes.get("cache_read", 0) or 0
+    metadados = getattr(response, "response_metadata", None) or {}
+    metricas["model"] = metadados.get("model_name") or metricas.get("model")
 
 
-def pensar(mensagem: str, system_prompt: str, historico: list = None) -> str:
+def pensar(mensagem: str, system_prompt: str, historico: list = None, metricas: dict = None,
+           contexto: str = None) -> str:
     """
     Processa uma mensagem e retorna a resposta do assistente com system prompt dinâmico.
     
     Args:
         mensagem: Mensagem do usuário
         system_prompt: System prompt a ser usado (baseado no perfil)
-        historico: Histórico de conversa (opcional) - lista de dicts com "role" e "content"
+        historico: Histórico de conversa (opcional) - `Conversa` da sessão (montagem incremental)
+            ou lista de dicts com "role" e "content"
+        metricas: Dict opcional preenchido com tokens, modelo e latência (ledger de uso)
+        contexto: Lembranças de conversas anteriores (memória de longo prazo), opcional
         
     Returns:
         Resposta do assistente
     """
+    if metricas is None:
+        metricas = {}
     llm = criar_llm()
+    metricas["model"] = llm.model_name
     
-    # Preparar mensagens do LangChain com system prompt dinâmico
-    mensagens = [SystemMessage(content=system_prompt)]
-    
-    # Adicionar histórico se fornecido (converter dicts para mensagens LangChain)
-    if historico:
-        for msg in historico:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "user":
-                mensagens.append(HumanMessage(content=content))
-            elif role == "assistant":
-                mensagens.append(AIMessage(content=content))
-    
-    # Adicionar mensagem atual
-    mensagens.append(HumanMessage(content=mensagem))
+    def preparar(modelo):
+        """Mensagens com system prompt dinâmico, no formato do caminho usado."""
+        if isinstance(historico, Conversa):
+            # Reaproveita os fragmentos JSON já serializados nos turnos anteriores
+            return historico.corpo_json(mensagem, system_prompt, contexto, parametros_da_requisicao(modelo))
+        return montar_de_dicts(mensagem, system_prompt, historico, contexto)
     
     # Obter resposta
     try:
         print(f"📤 Enviando mensagem para o modelo...")
-        response = llm.invoke(mensagens)
+        inicio = time.perf_counter()
+        response = invocar_com_politica(llm, preparar(llm))
+        metricas["latency_llm_ms"] = int((time.perf_counter() - inicio) * 1000)
+        extrair_uso(response, metricas)
         resposta_texto = response.content if hasattr(response, 'content') else str(response)
-        print(f"✅ Resposta recebida ({len(resposta_texto)} caracteres)")
+        print(
+            f"✅ Resposta recebida ({len(resposta_texto)} caracteres | "
+            f"tokens: {metricas['prompt_tokens']} entrada, {metricas['completion_tokens']} saída, "
+            f"{metricas['cached_tokens']} cache | {metricas['latency_llm_ms']} ms)"
+        )
         return resposta_texto
     except Exception as e:
         error_msg = str(e)
@@ -155,8 +310,13 @@ def pensar(mensagem: str, system_prompt: str, historico: list = None) -> str:
                     temperature=0.7,
                     max_tokens=2000,
                     timeout=60,
+                    max_retries=0,
                 )
-                response = llm_fallback.invoke(mensagens)
+                inicio = time.perf_counter()
+                response = invocar_com_politica(llm_fallback, preparar(llm_fallback))
+                metricas["model"] = "gpt-3.5-turbo"
+                metricas["latency_llm_ms"] = int((time.perf_counter() - inicio) * 1000)
+                extrair_uso(response, metricas)
                 return response.content if hasattr(response, 'content') else str(response)
             except Exception as e2:
                 raise Exception(f"Erro ao processar mensagem (tentativa com fallback também falhou): {str(e2)}")
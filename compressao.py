@@ -0,0 +1,219 @@
+"""
+Compressão de Mensagens - Armazena corpos grandes comprimidos no banco.
+
+Mensagens acima de COMPRESSAO_LIMIAR bytes são gravadas comprimidas em
+`messages.content_z`, com o codec usado em `messages.codec`. Linhas antigas
+(codec vazio) continuam sendo lidas da coluna `content` original.
+
+Os codecs usam um dicionário compartilhado com o vocabulário típico das
+respostas (Python, markdown, português), o que rende bem mais que a compressão
+"a frio" em mensagens de poucos KB. O dicionário é versionado no nome do codec:
+para trocá-lo, crie uma nova versão e mantenha a antiga para leitura.
+
+O codec de gravação é zlib (biblioteca padrão). zstd é opt-in com
+COMPRESSAO_CODEC=zstd-d1: as linhas gravadas assim exigem o pacote
+`zstandard` em todo ambiente que for lê-las.
+
+Uso:
+    python compressao.py medir     # Mostra o espaço economizado
+    python compressao.py migrar    # Comprime mensagens antigas acima do limiar
+"""
+import os
+import sys
+import zlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; sem ele usa zlib (biblioteca padrão)
+    zstandard = None
+
+COMPRESSAO_LIMIAR = int(os.getenv("COMPRESSAO_LIMIAR", "1024"))
+COMPRESSAO_ATIVA = os.getenv("COMPRESSAO_ATIVA", "1") == "1"
+
+# Só vale a pena guardar comprimido se economizar pelo menos 10%
+RAZAO_MAXIMA = 0.9
+
+# Dicionário v1: trechos frequentes em respostas do GaMi. O zlib prioriza o
+# final do dicionário, então os padrões mais comuns ficam por último.
+DICIONARIO_V1 = "\n".join([
+    "Análise estratégica, planejamento, mercado, concorrência, riscos, oportunidades, clientes, receita, custos.",
+    "Recomendações: 1. Curto prazo 2. Médio prazo 3. Longo prazo. Próximos passos:",
+    "| Item | Descrição | Prioridade |\n|------|-----------|------------|",
+    "```bash\npip install -r requirements.txt\n```",
+    "```sql\nSELECT * FROM messages WHERE thread_id = ? ORDER BY created_at;\n```",
+    "from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey",
+    "from fastapi import FastAPI, HTTPException, Depends",
+    "from typing import List, Dict, Optional, Any",
+    "from dataclasses import dataclass",
+    "import os\nimport sys\nimport json\nimport asyncio\nfrom pathlib import Path",
+    "async def main():\n    await asyncio.gather(*tarefas)\n\nif __name__ == \"__main__\":\n    asyncio.run(main())",
+    "class Config:\n    def __init__(self, *args, **kwargs):\n        super().__init__(*args, **kwargs)",
+    "    try:\n        resultado = funcao()\n    except Exception as e:\n        raise ValueError(f\"Erro: {e}\")",
+    "    for item in items:\n        if item is None:\n            continue\n        return item",
+    "    def __init__(self):\n        self.",
+    "    return self.",
+    "## Explicação\n\n## Exemplo\n\n## Código\n\n### Observações\n\n**Importante:** ",
+    "Você pode usar o seguinte código para ",
+    "Aqui está um exemplo de como implementar isso em Python:\n\n```python\n",
+    "```python\ndef ",
+    "\n```\n\n",
+]).encode("utf-8")
+
+_ZSTD_DICT_V1 = (
+    zstandard.ZstdCompressionDict(DICIONARIO_V1, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    if zstandard else None
+)
+
+CODECS = ("zlib-d1", "zlib", "zstd-d1")
+
+# Codec das novas gravações (zstd só se pedido e instalado)
+CODEC_PADRAO = os.getenv("COMPRESSAO_CODEC", "zlib-d1").lower()
+if CODEC_PADRAO not in CODECS:
+    CODEC_PADRAO = "zlib-d1"
+if CODEC_PADRAO == "zstd-d1" and zstandard is None:
+    print("⚠️ COMPRESSAO_CODEC=zstd-d1, mas o pacote 'zstandard' não está instalado; usando zlib-d1")
+    CODEC_PADRAO = "zlib-d1"
+
+
+def _comprimir_bytes(dados: bytes, codec: str) -> bytes:
+    if codec == "zlib-d1":
+        compressor = zlib.compressobj(level=9, zdict=DICIONARIO_V1)
+        return compressor.compress(dados) + compressor.flush()
+    if codec == "zlib":
+        return zlib.compress(dados, 9)
+    if codec == "zstd-d1":
+        return zstandard.ZstdCompressor(level=9, dict_data=_ZSTD_DICT_V1).compress(dados)
+    raise ValueError(f"Codec de compressão desconhecido: {codec}")
+
+
+def comprimir(texto: str, codec: str = None):
+    """
+    Comprime o texto se ele passar do limiar e a compressão compensar.
+
+    Args:
+        texto: Conteúdo da mensagem
+        codec: Codec a usar (padrão: CODEC_PADRAO)
+
+    Returns:
+        Tupla (bytes_comprimidos, codec) ou (None, None) para guardar em texto puro
+    """
+    if not COMPRESSAO_ATIVA or texto is None:
+        return None, None
+    dados = texto.encode("utf-8")
+    if len(dados) < COMPRESSAO_LIMIAR:
+        return None, None
+    codec = codec or CODEC_PADRAO
+    comprimido = _comprimir_bytes(dados, codec)
+    if len(comprimido) > len(dados) * RAZAO_MAXIMA:
+        return None, None
+    return comprimido, codec
+
+
+def descomprimir(dados: bytes, codec: str) -> str:
+    """
+    Restaura o texto original de uma mensagem comprimida.
+
+    Args:
+        dados: Bytes de `content_z`
+        codec: Valor da coluna `codec`
+
+    Returns:
+        Texto original
+    """
+    if codec == "zlib-d1":
+        descompressor = zlib.decompressobj(zdict=DICIONARIO_V1)
+        bruto = descompressor.decompress(dados) + descompressor.flush()
+    elif codec == "zlib":
+        bruto = zlib.decompress(dados)
+    elif codec == "zstd-d1":
+        if zstandard is None:
+            raise RuntimeError("Mensagem comprimida com zstd, mas o pacote 'zstandard' não está instalado")
+        bruto = zstandard.ZstdDecompressor(dict_data=_ZSTD_DICT_V1).decompress(dados)
+    else:
+        raise ValueError(f"Codec de compressão desconhecido: {codec}")
+    return bruto.decode("utf-8")
+
+
+def medir(db) -> dict:
+    """
+    Compara o tamanho original das mensagens com o tamanho armazenado.
+
+    Returns:
+        Dict com totais de mensagens, comprimidas, bytes originais e armazenados
+    """
+    from sqlalchemy import func
+    from sqlalchemy.orm import undefer
+    from models import Message
+
+    resultado = {"mensagens": 0, "comprimidas": 0, "bytes_originais": 0, "bytes_armazenados": 0}
+    resultado["mensagens"] = db.query(func.count(Message.id)).scalar() or 0
+
+    ultimo_id = 0
+    while True:
+        linhas = db.query(Message).options(undefer(Message.content_z)).filter(
+            Message.id > ultimo_id
+        ).order_by(Message.id).limit(1000).all()
+        if not linhas:
+            break
+        for m in linhas:
+            original = len(m.content.encode("utf-8"))
+            resultado["bytes_originais"] += original
+            if m.codec:
+                resultado["comprimidas"] += 1
+                resultado["bytes_armazenados"] += len(m.content_z)
+            else:
+                resultado["bytes_armazenados"] += original
+        ultimo_id = linhas[-1].id
+        db.expunge_all()
+    return resultado
+
+
+def migrar(db, lote: int = 500) -> int:
+    """
+    Comprime mensagens antigas gravadas em texto puro acima do limiar.
+
+    Returns:
+        Quantidade de mensagens comprimidas
+    """
+    from sqlalchemy import func
+    from models import Message
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        linhas = db.query(Message).filter(
+            Message.id > ultimo_id,
+            Message.codec.is_(None),
+            func.length(Message._content) >= COMPRESSAO_LIMIAR // 4,
+        ).order_by(Message.id).limit(lote).all()
+        if not linhas:
+            break
+        for m in linhas:
+            antes = m.codec
+            m.content = m.content  # O setter decide se comprime
+            if m.codec != antes:
+                total += 1
+        db.commit()
+        ultimo_id = linhas[-1].id
+        db.expunge_all()
+    return total
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    init_db()
+    comando = sys.argv[1] if len(sys.argv) > 1 else "medir"
+    with SessionLocal() as db:
+        if comando == "migrar":
+            print(f"✅ {migrar(db)} mensagens comprimidas")
+        medida = medir(db)
+    economia = 1 - medida["bytes_armazenados"] / max(1, medida["bytes_originais"])
+    print(
+        f"📦 {medida['mensagens']} mensagens ({medida['comprimidas']} comprimidas) | "
+        f"original: {medida['bytes_originais']} bytes | armazenado: {medida['bytes_armazenados']} bytes | "
+        f"economia: {economia:.1%}"
+    )
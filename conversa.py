@@ -0,0 +1,269 @@
+"""
+Conversa Incremental - Monta o prompt de cada turno sem reconstruir o histórico.
+
+Antes, `pensar` recriava a lista inteira de mensagens do LangChain a partir
+dos dicts do histórico a cada chamada, e o ChatOpenAI e o SDK da OpenAI
+convertiam e validavam mensagem por mensagem de novo: o turno N custava O(N)
+trabalho em Python antes de qualquer I/O. Aqui cada sessão guarda uma
+`Conversa` que só cresce:
+
+- cada mensagem vira um `Registro` (com __slots__) serializado no formato da
+  API de chat uma única vez, no turno em que chega;
+- a `Conversa` mantém a lista desses fragmentos JSON, estendida a cada turno;
+- o system prompt de cada perfil é um registro imutável compartilhado por
+  todas as sessões do mesmo perfil.
+
+O corpo da requisição é montado juntando os fragmentos já serializados
+(`corpo_json`) e enviado pelo mesmo cliente HTTP do ChatOpenAI (ver
+`cerebro.invocar_com_politica`). O que resta de O(N) por turno é a cópia de
+bytes do corpo, não conversão de mensagens.
+
+Uso:
+    python conversa.py --benchmark --turnos 200
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+CLASSES_MENSAGEM = {
+    "user": HumanMessage,
+    "assistant": AIMessage,
+    "system": SystemMessage,
+}
+
+
+def serializar(objeto) -> bytes:
+    """JSON compacto em UTF-8, como vai no corpo da requisição."""
+    return json.dumps(objeto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Registro:
+    """
+    Uma mensagem pronta para envio: papel, texto e fragmento JSON no formato
+    da API de chat. Não deve ser alterado depois de criado (é compartilhado
+    entre turnos e, no caso do system prompt, entre sessões).
+    """
+
+    __slots__ = ("role", "content", "json")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.json = serializar({"role": role, "content": content})
+
+    @property
+    def mensagem(self):
+        """Objeto do LangChain equivalente (criado sob demanda, não fica em memória)."""
+        return CLASSES_MENSAGEM[self.role](content=self.content)
+
+    def get(self, chave: str, padrao=None):
+        """Compatível com o histórico antigo em dicts (`msg.get("role")`)."""
+        if chave in ("role", "content"):
+            return getattr(self, chave)
+        return padrao
+
+    def como_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+# System prompts compartilhados entre sessões (um registro por texto de perfil)
+_SISTEMAS = {}
+_lock_sistemas = threading.Lock()
+
+
+def registro_sistema(system_prompt: str) -> Registro:
+    """
+    Retorna o registro compartilhado do system prompt (criado na primeira vez).
+
+    Args:
+        system_prompt: Texto do system prompt do perfil
+
+    Returns:
+        Registro imutável reaproveitado por todas as sessões
+    """
+    registro = _SISTEMAS.get(system_prompt)
+    if registro is not None:
+        return registro
+    with _lock_sistemas:
+        if system_prompt not in _SISTEMAS:
+            _SISTEMAS[system_prompt] = Registro("system", system_prompt)
+        return _SISTEMAS[system_prompt]
+
+
+class Conversa:
+    """
+    Histórico de uma sessão que cresce só por append.
+
+    Aceita os mesmos usos do histórico antigo em lista de dicts: `len`,
+    iteração (registros com `.get`) e fatiamento (`conversa[-12:]` devolve
+    outra Conversa que reaproveita os mesmos registros).
+    """
+
+    __slots__ = ("registros", "fragmentos")
+
+    def __init__(self, registros: list = None):
+        self.registros = list(registros) if registros else []
+        # Fragmentos JSON do histórico, na ordem (estendidos a cada mensagem nova)
+        self.fragmentos = [registro.json for registro in self.registros]
+
+    @classmethod
+    def de_dicts(cls, historico: list) -> "Conversa":
+        """Converte um histórico antigo (lista de dicts com "role" e "content")."""
+        conversa = cls()
+        for msg in historico or []:
+            role = msg.get("role", "user")
+            if role in ("user", "assistant"):
+                conversa.adicionar(role, msg.get("content", ""))
+        return conversa
+
+    def __len__(self):
+        return len(self.registros)
+
+    def __iter__(self):
+        return iter(self.registros)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return Conversa(self.registros[indice])
+        return self.registros[indice]
+
+    def adicionar(self, role: str, content: str) -> Registro:
+        registro = Registro(role, content)
+        self.registros.append(registro)
+        self.fragmentos.append(registro.json)
+        return registro
+
+    def adicionar_turno(self, pergunta: str, resposta: str):
+        """Registra a pergunta do usuário e a resposta do assistente."""
+        self.adicionar("user", pergunta)
+        self.adicionar("assistant", resposta)
+
+    def corpo_json(self, mensagem: str, system_prompt: str, contexto: str = None,
+                   parametros: dict = None) -> bytes:
+        """
+        Monta o corpo da requisição de chat do turno atual.
+
+        Só a pergunta atual (e o contexto da memória, se houver) são
+        serializados agora; system prompt e histórico entram como os
+        fragmentos JSON já prontos.
+
+        Args:
+            mensagem: Pergunta atual do usuário
+            system_prompt: System prompt do perfil
+            contexto: Lembranças de conversas anteriores (opcional)
+            parametros: Demais campos do corpo (model, temperature, ...)
+
+        Returns:
+            Corpo JSON em bytes, pronto para POST /chat/completions
+        """
+        partes = [registro_sistema(system_prompt).json]
+        if contexto:
+            partes.append(serializar({"role": "system", "content": contexto}))
+        if self.fragmentos:
+            partes.append(b",".join(self.fragmentos))
+        partes.append(serializar({"role": "user", "content": mensagem}))
+
+        cabecalho = serializar(parametros or {})[:-1]  # Sem o "}" final
+        separador = b"," if len(cabecalho) > 1 else b""
+        return cabecalho + separador + b'"messages":[' + b",".join(partes) + b"]}"
+
+    def montar(self, mensagem: str, system_prompt: str, contexto: str = None) -> list:
+        """
+        Monta a lista de mensagens do LangChain para o turno atual (para quem
+        chama `llm.invoke` direto; `pensar` usa `corpo_json`).
+
+        Returns:
+            Lista de mensagens pronta para `llm.invoke`
+        """
+        mensagens = [registro_sistema(system_prompt).mensagem]
+        if contexto:
+            mensagens.append(SystemMessage(content=contexto))
+        mensagens.extend(registro.mensagem for registro in self.registros)
+        mensagens.append(HumanMessage(content=mensagem))
+        return mensagens
+
+
+def montar_de_dicts(mensagem: str, system_prompt: str, historico: list = None, contexto: str = None) -> list:
+    """
+    Montagem completa a partir de dicts (caminho antigo, usado pelo modo em
+    lote e como referência no benchmark).
+    """
+    mensagens = [SystemMessage(content=system_prompt)]
+    if contexto:
+        mensagens.append(SystemMessage(content=contexto))
+    for msg in historico or []:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if role == "user":
+            mensagens.append(HumanMessage(content=content))
+        elif role == "assistant":
+            mensagens.append(AIMessage(content=content))
+    mensagens.append(HumanMessage(content=mensagem))
+    return mensagens
+
+
+def _medir_ms(funcao, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+
+def benchmark(turnos: int = 200, tamanho: int = 600, pontos: int = 5, repeticoes: int = 20) -> list:
+    """
+    Mede, ao longo dos turnos, o trabalho de `pensar` antes da rede:
+
+    - antes: dicts -> mensagens do LangChain -> payload do ChatOpenAI ->
+      validação/transformação do SDK da OpenAI (o que `llm.invoke` faz);
+    - depois: `Conversa.corpo_json` (fragmentos já serializados).
+
+    Returns:
+        Lista de dicts {"turno", "antes_ms", "depois_ms"}
+    """
+    from langchain_openai import ChatOpenAI
+    from openai._utils import maybe_transform
+    from openai.types.chat.completion_create_params import CompletionCreateParamsNonStreaming
+
+    llm = ChatOpenAI(model="gpt-4o", api_key="sk-benchmark-local", max_retries=0)  # Sem rede
+    system_prompt = "Você é o GaMi-AI, um assistente de benchmark."
+    resposta = ("Resposta longa do assistente para o benchmark. " * (tamanho // 46 + 1))[:tamanho]
+    parametros = {k: v for k, v in llm._get_request_payload([HumanMessage(content="")]).items() if k != "messages"}
+    historico, conversa = [], Conversa()
+    marcos = {max(1, turnos * i // pontos) for i in range(1, pontos + 1)}
+    resultados = []
+
+    def caminho_langchain(pergunta):
+        payload = llm._get_request_payload(montar_de_dicts(pergunta, system_prompt, historico))
+        return maybe_transform(payload, CompletionCreateParamsNonStreaming)
+
+    for turno in range(1, turnos + 1):
+        pergunta = f"Pergunta {turno}: como estruturar o projeto?"
+        if turno in marcos:
+            resultados.append({
+                "turno": turno,
+                "antes_ms": _medir_ms(lambda: caminho_langchain(pergunta), repeticoes),
+                "depois_ms": _medir_ms(lambda: conversa.corpo_json(pergunta, system_prompt, None, parametros), repeticoes),
+            })
+        historico.append({"role": "user", "content": pergunta})
+        historico.append({"role": "assistant", "content": resposta})
+        conversa.adicionar_turno(pergunta, resposta)
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversa incremental do GaMi-AI")
+    parser.add_argument("--benchmark", action="store_true", help="Compara o caminho do LangChain x corpo montado por fragmentos")
+    parser.add_argument("--turnos", type=int, default=200, help="Turnos simulados")
+    parser.add_argument("--tamanho", type=int, default=600, help="Caracteres de cada resposta simulada")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(0)
+
+    print(f"{'turno':>6} | {'antes (LangChain + SDK)':>24} | {'depois (corpo_json)':>20} | ganho")
+    for r in benchmark(args.turnos, args.tamanho):
+        print(f"{r['turno']:>6} | {r['antes_ms']:>21.3f} ms | {r['depois_ms']:>17.3f} ms | {r['antes_ms'] / r['depois_ms']:.0f}x")
@@ -4,8 +4,8 @@ Configuração do Banco de Dados - Lógica Dual (PostgreSQL/SQLite)
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from models import Base, ChatProfile, Message
+from datetime import datetime
+from models import Base, ChatProfile, Message, ThreadSummary
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -56,8 +56,9 @@ else:
 if usar_sqlite:
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool
+        # Uma conexão por thread (backup, ledger e memória gravam em paralelo);
+        # StaticPool compartilhava uma única conexão e quebrava commits concorrentes
+        connect_args={"check_same_thread": False, "timeout": 30},
     )
     print(f"✅ Conectado ao SQLite (Local): {DATABASE_URL}")
 else:
@@ -74,9 +75,51 @@ def init_db():
     Inicializa o banco de dados criando todas as tabelas.
     """
     Base.metadata.create_all(bind=engine)
+    adicionadas = migrar_colunas()
+    with SessionLocal() as db:
+        if db.query(ThreadSummary.thread_id).first() is None and db.query(Message.id).first() is not None:
+            print(f"🔧 Índice de threads criado: {reconstruir_resumos_threads(db)} threads")
+        elif "thread_summaries.owner_id" in adicionadas:
+            # Índice criado antes do dono existir: recalcula para preencher owner_id
+            print(f"🔧 Índice de threads recalculado: {reconstruir_resumos_threads(db)} threads")
     print("✅ Tabelas criadas/verificadas no banco de dados")
 
 
+def migrar_colunas():
+    """
+    Adiciona em tabelas já existentes as colunas e índices novos dos modelos.
+    
+    `create_all` só cria tabelas que não existem; bancos criados por versões
+    anteriores precisam do ALTER TABLE para as colunas adicionadas depois.
+    Colunas novas sempre são anuláveis, então linhas antigas continuam válidas.
+    
+    Returns:
+        Lista "tabela.coluna" das colunas adicionadas
+    """
+    from sqlalchemy import inspect, text
+    
+    adicionadas = []
+    inspetor = inspect(engine)
+    with engine.begin() as conn:
+        for tabela in Base.metadata.sorted_tables:
+            if not inspetor.has_table(tabela.name):
+                continue
+            existentes = {c["name"] for c in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in existentes:
+                    continue
+                tipo = coluna.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+                print(f"🔧 Coluna adicionada: {tabela.name}.{coluna.name}")
+                adicionadas.append(f"{tabela.name}.{coluna.name}")
+            indices = {i["name"] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name not in indices:
+                    indice.create(bind=conn)
+                    print(f"🔧 Índice criado: {indice.name}")
+    return adicionadas
+
+
 # Session Local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -120,3 +163,156 @@ def criar_perfis_padrao(db: Session):
     db.commit()
     print("✅ Perfis padrão criados/verificados")
 
+
+TAMANHO_TITULO = 100
+
+
+def titulo_da_mensagem(texto: str) -> str:
+    """Gera o título da thread a partir da primeira mensagem do usuário."""
+    titulo = " ".join((texto or "").split())
+    return titulo if len(titulo) <= TAMANHO_TITULO else titulo[:TAMANHO_TITULO - 1] + "…"
+
+
+def atualizar_resumo_thread(db: Session, thread_id: str, profile_id, primeira_mensagem: str,
+                            novas_mensagens: int, novas_do_usuario: int, momento: datetime = None,
+                            dono: str = None):
+    """
+    Atualiza incrementalmente o índice de threads (sem commit).
+    
+    Usa UPDATE atômico (contador += n) para não perder incrementos quando dois
+    backups da mesma thread rodam ao mesmo tempo; só insere se a thread é nova.
+    
+    Args:
+        db: Sessão do banco de dados
+        thread_id: ID da thread
+        profile_id: ID do perfil
+        primeira_mensagem: Texto usado como título se a thread for nova
+        novas_mensagens: Quantidade de mensagens adicionadas
+        novas_do_usuario: Quantas delas são do usuário
+        momento: Horário da última mensagem (padrão: agora)
+        dono: Usuário autenticado dono da thread (None em sessões anônimas)
+    """
+    momento = momento or datetime.utcnow()
+    atualizadas = db.query(ThreadSummary).filter(ThreadSummary.thread_id == thread_id).update({
+        ThreadSummary.message_count: ThreadSummary.message_count + novas_mensagens,
+        ThreadSummary.user_message_count: ThreadSummary.user_message_count + novas_do_usuario,
+        ThreadSummary.last_message_at: momento,
+    }, synchronize_session=False)
+    if not atualizadas:
+        db.add(ThreadSummary(
+            thread_id=thread_id,
+            profile_id=profile_id,
+            owner_id=dono,
+            title=titulo_da_mensagem(primeira_mensagem),
+            message_count=novas_mensagens,
+            user_message_count=novas_do_usuario,
+            created_at=momento,
+            last_message_at=momento,
+        ))
+
+
+def reconstruir_resumos_threads(db: Session, thread_ids: list = None) -> int:
+    """
+    Recalcula o índice de threads a partir de `messages` (carga inicial ou importação).
+    
+    Args:
+        db: Sessão do banco de dados
+        thread_ids: Restringe às threads informadas (padrão: todas)
+        
+    Returns:
+        Quantidade de threads reconstruídas
+    """
+    from sqlalchemy import func, case
+    
+    consulta = db.query(
+        Message.thread_id,
+        func.min(Message.profile_id),
+        func.max(Message.owner_id),
+        func.count(Message.id),
+        func.sum(case((Message.role == "user", 1), else_=0)),
+        func.min(Message.created_at),
+        func.max(Message.created_at),
+        func.min(case((Message.role == "user", Message.id), else_=None)),
+    ).group_by(Message.thread_id)
+    if thread_ids is not None:
+        consulta = consulta.filter(Message.thread_id.in_(thread_ids))
+        db.query(ThreadSummary).filter(ThreadSummary.thread_id.in_(thread_ids)).delete(synchronize_session=False)
+    else:
+        db.query(ThreadSummary).delete(synchronize_session=False)
+    
+    total = 0
+    for tid, pid, dono, contagem, do_usuario, primeira, ultima, id_titulo in consulta.all():
+        titulo_msg = db.get(Message, id_titulo) if id_titulo else None
+        db.add(ThreadSummary(
+            thread_id=tid,
+            profile_id=pid,
+            owner_id=dono,
+            title=titulo_da_mensagem(titulo_msg.content) if titulo_msg else None,
+            message_count=contagem,
+            user_message_count=do_usuario or 0,
+            created_at=primeira,
+            last_message_at=ultima or datetime.utcnow(),
+        ))
+        total += 1
+    db.commit()
+    return total
+
+
+def listar_threads_recentes(db: Session, dono: str, limite: int = 20, cursor: tuple = None,
+                            perfil: str = None, todos: bool = False) -> dict:
+    """
+    Lista as conversas mais recentes de um usuário lendo só o índice de threads.
+    
+    A paginação é por keyset: passe o `proximo_cursor` da página anterior em
+    `cursor`. O custo por página não depende do tamanho do histórico.
+    
+    O dono é obrigatório: sessões anônimas não têm identidade para separar as
+    conversas de cada visitante, então não têm listagem. `todos=True` ignora o
+    dono e serve só para ferramentas de administração.
+    
+    Args:
+        db: Sessão do banco de dados
+        dono: Identificador do usuário autenticado
+        limite: Threads por página
+        cursor: Tupla (last_message_at, thread_id) da última thread já exibida
+        perfil: Filtra por nome do perfil (opcional)
+        todos: Lista as threads de todos os donos (administração)
+        
+    Returns:
+        Dict {"threads": [...], "proximo_cursor": tupla ou None}
+    """
+    from sqlalchemy import and_, or_
+    
+    if not dono and not todos:
+        raise ValueError("listar_threads_recentes exige o dono (ou todos=True para administração)")
+    
+    consulta = db.query(ThreadSummary, ChatProfile.name).outerjoin(
+        ChatProfile, ChatProfile.id == ThreadSummary.profile_id
+    )
+    if not todos:
+        consulta = consulta.filter(ThreadSummary.owner_id == dono)
+    if perfil:
+        consulta = consulta.filter(ChatProfile.name == perfil)
+    if cursor:
+        ultima, tid = cursor
+        consulta = consulta.filter(or_(
+            ThreadSummary.last_message_at < ultima,
+            and_(ThreadSummary.last_message_at == ultima, ThreadSummary.thread_id < tid),
+        ))
+    linhas = consulta.order_by(
+        ThreadSummary.last_message_at.desc(), ThreadSummary.thread_id.desc()
+    ).limit(limite).all()
+    
+    threads = [
+        {
+            "thread_id": t.thread_id,
+            "title": t.title,
+            "profile": nome,
+            "owner": t.owner_id,
+            "message_count": t.message_count,
+            "last_message_at": t.last_message_at,
+        }
+        for t, nome in linhas
+    ]
+    proximo = (linhas[-1][0].last_message_at, linhas[-1][0].thread_id) if len(linhas) == limite else None
+    return {"threads": threads, "proximo_cursor": proximo}
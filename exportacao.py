@@ -0,0 +1,374 @@
+"""
+Exportação e Importação - Conversas em NDJSON (uma mensagem por linha).
+
+A exportação percorre `messages` por keyset (id > último id, em lotes), então
+a memória fica constante mesmo com dezenas de milhões de linhas. Cada linha
+traz a thread, o perfil (pelo nome), o dono, o papel, o texto já
+descomprimido e a data, o que permite migrar um ambiente entre SQLite e
+PostgreSQL:
+
+    DATABASE_URL=sqlite:///chainlit.db python exportacao.py exportar conversas.ndjson.gz
+    DATABASE_URL=postgresql://...     python exportacao.py importar conversas.ndjson.gz
+
+Filtros: --perfil, --desde, --ate (ISO 8601) e --thread (pode repetir).
+Arquivos terminados em .gz são gravados/lidos com gzip.
+
+A importação é idempotente: mensagens que já existem no destino (mesma
+thread, data e papel) são ignoradas, então um import interrompido pode ser
+simplesmente executado de novo.
+
+Também disponível como ação de administração (com ADMIN_TOKEN definido):
+
+    GET /admin/exportar?perfil=modo_geral&desde=2025-01-01&gzip=1
+    Authorization: Bearer <ADMIN_TOKEN>
+"""
+import os
+import hmac
+import gzip
+import json
+import zlib
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "1000"))
+
+# Tamanho aproximado de cada bloco enviado na resposta HTTP
+TAMANHO_BLOCO_HTTP = 64 * 1024
+
+# Limite de parâmetros por IN (o SQLite antigo aceita no máximo 999)
+LOTE_THREADS = 500
+
+
+def _data(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(valor)
+
+
+def iterar_mensagens(db, perfil: str = None, desde=None, ate=None, thread_ids: list = None,
+                     lote: int = EXPORTACAO_LOTE):
+    """
+    Percorre as mensagens em ordem de id, em lotes, sem carregar a tabela inteira.
+
+    Args:
+        db: Sessão do banco de dados
+        perfil: Nome do perfil (opcional)
+        desde: Data/hora mínima de `created_at` (datetime ou ISO 8601, opcional)
+        ate: Data/hora máxima de `created_at`, exclusiva (opcional)
+        thread_ids: Restringe às threads informadas (opcional)
+        lote: Linhas buscadas por consulta
+
+    Yields:
+        Dicts {"thread_id", "profile", "owner", "role", "content", "created_at"}
+    """
+    from models import ChatProfile, Message
+    from compressao import descomprimir
+
+    perfis = dict(db.query(ChatProfile.id, ChatProfile.name).all())
+    consulta = db.query(
+        Message.id, Message.thread_id, Message.profile_id, Message.owner_id, Message.role,
+        Message._content, Message.content_z, Message.codec, Message.created_at,
+    )
+    if perfil:
+        ids_perfil = [pid for pid, nome in perfis.items() if nome == perfil]
+        if not ids_perfil:
+            return
+        consulta = consulta.filter(Message.profile_id.in_(ids_perfil))
+    if desde:
+        consulta = consulta.filter(Message.created_at >= _data(desde))
+    if ate:
+        consulta = consulta.filter(Message.created_at < _data(ate))
+    if thread_ids:
+        consulta = consulta.filter(Message.thread_id.in_(list(thread_ids)))
+
+    ultimo_id = 0
+    while True:
+        linhas = consulta.filter(Message.id > ultimo_id).order_by(Message.id).limit(lote).all()
+        if not linhas:
+            break
+        for _id, thread_id, profile_id, owner_id, role, content, content_z, codec, created_at in linhas:
+            yield {
+                "thread_id": thread_id,
+                "profile": perfis.get(profile_id),
+                "owner": owner_id,
+                "role": role,
+                "content": descomprimir(content_z, codec) if codec else content,
+                "created_at": created_at.isoformat() if created_at else None,
+            }
+        ultimo_id = linhas[-1][0]
+
+
+def linhas_ndjson(db, **filtros):
+    """Gera cada mensagem como uma linha NDJSON em bytes (UTF-8)."""
+    for registro in iterar_mensagens(db, **filtros):
+        yield (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def exportar(db, destino: str, comprimir: bool = None, **filtros) -> int:
+    """
+    Grava as mensagens em um arquivo NDJSON.
+
+    Args:
+        db: Sessão do banco de dados
+        destino: Caminho do arquivo
+        comprimir: Usa gzip (padrão: se o destino terminar em .gz)
+        **filtros: perfil, desde, ate, thread_ids (ver `iterar_mensagens`)
+
+    Returns:
+        Quantidade de mensagens exportadas
+    """
+    if comprimir is None:
+        comprimir = destino.endswith(".gz")
+    total = 0
+    with open(destino, "wb") as bruto:
+        arquivo = gzip.GzipFile(fileobj=bruto, mode="wb") if comprimir else bruto
+        try:
+            for linha in linhas_ndjson(db, **filtros):
+                arquivo.write(linha)
+                total += 1
+        finally:
+            if comprimir:
+                arquivo.close()
+    return total
+
+
+def _abrir_entrada(origem: str):
+    bruto = open(origem, "rb")
+    # Detecta gzip pelo cabeçalho, não só pela extensão
+    if bruto.peek(2)[:2] == b"\x1f\x8b":
+        return gzip.GzipFile(fileobj=bruto, mode="rb")
+    return bruto
+
+
+def _chave(thread_id, created_at, role) -> tuple:
+    return (thread_id, created_at, role)
+
+
+def _chaves_existentes(db, linhas: list) -> set:
+    """
+    Busca no destino as chaves (thread, data, papel) das mensagens do lote que
+    já foram importadas, consultando só as threads e o intervalo de datas do lote.
+    """
+    from models import Message
+
+    threads = sorted({linha["thread_id"] for linha in linhas})
+    inicio = min(linha["created_at"] for linha in linhas)
+    fim = max(linha["created_at"] for linha in linhas)
+    existentes = set()
+    for i in range(0, len(threads), LOTE_THREADS):
+        consulta = db.query(Message.thread_id, Message.created_at, Message.role).filter(
+            Message.thread_id.in_(threads[i:i + LOTE_THREADS]),
+            Message.created_at >= inicio,
+            Message.created_at <= fim,
+        )
+        existentes.update(_chave(*linha) for linha in consulta)
+    return existentes
+
+
+def _inserir_lote(db, linhas: list) -> int:
+    """
+    Insere o lote ignorando mensagens já presentes no destino (ou repetidas no
+    próprio lote) e faz commit.
+
+    Returns:
+        Quantidade de mensagens inseridas
+    """
+    from sqlalchemy import insert
+    from models import Message
+
+    vistas = _chaves_existentes(db, linhas)
+    novas = []
+    for linha in linhas:
+        chave = _chave(linha["thread_id"], linha["created_at"], linha["role"])
+        if chave not in vistas:
+            vistas.add(chave)
+            novas.append(linha)
+    if novas:
+        db.execute(insert(Message.__table__), novas)
+    db.commit()
+    return len(novas)
+
+
+def importar(db, origem: str, lote: int = EXPORTACAO_LOTE) -> dict:
+    """
+    Importa um arquivo NDJSON gerado por `exportar`, com inserts em lote.
+
+    As mensagens recebem ids novos no destino (não colidem com as existentes) e
+    são comprimidas com a mesma regra do modelo. Mensagens que já existem no
+    destino, pela chave (thread_id, created_at, role), são ignoradas: rodar de
+    novo após uma falha no meio completa o import sem duplicar linhas. Perfis
+    que não existirem são criados. Ao final, o índice de threads é recalculado
+    para as threads importadas.
+
+    Args:
+        db: Sessão do banco de dados
+        origem: Caminho do arquivo (gzip é detectado pelo cabeçalho)
+        lote: Mensagens por INSERT
+
+    Returns:
+        Dict {"mensagens", "ignoradas", "threads"}
+    """
+    from models import ChatProfile
+    from compressao import comprimir
+    from database import reconstruir_resumos_threads
+
+    perfis = {nome: pid for pid, nome in db.query(ChatProfile.id, ChatProfile.name).all()}
+    threads = set()
+    pendentes = []
+    total = 0
+    lidas = 0
+
+    arquivo = _abrir_entrada(origem)
+    try:
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Linha {numero} inválida: {e}")
+
+            nome_perfil = registro.get("profile")
+            if nome_perfil and nome_perfil not in perfis:
+                novo = ChatProfile(name=nome_perfil)
+                db.add(novo)
+                db.commit()
+                perfis[nome_perfil] = novo.id
+
+            # Insert em lote não passa pelo setter de Message.content: comprime aqui
+            texto = registro.get("content") or ""
+            dados, codec = comprimir(texto)
+            pendentes.append({
+                "thread_id": registro["thread_id"],
+                "profile_id": perfis.get(nome_perfil),
+                "owner_id": registro.get("owner"),
+                "role": registro.get("role", "user"),
+                "content": "" if dados is not None else texto,
+                "content_z": dados,
+                "codec": codec,
+                "created_at": _data(registro.get("created_at")) or datetime.utcnow(),
+            })
+            threads.add(registro["thread_id"])
+
+            if len(pendentes) >= lote:
+                total += _inserir_lote(db, pendentes)
+                lidas += len(pendentes)
+                pendentes = []
+                if lidas % (lote * 10) == 0:
+                    print(f"📥 {lidas} mensagens lidas, {total} importadas...")
+        if pendentes:
+            total += _inserir_lote(db, pendentes)
+            lidas += len(pendentes)
+    finally:
+        arquivo.close()
+
+    lista = sorted(threads)
+    for i in range(0, len(lista), LOTE_THREADS):
+        reconstruir_resumos_threads(db, lista[i:i + LOTE_THREADS])
+    return {"mensagens": total, "ignoradas": lidas - total, "threads": len(lista)}
+
+
+def _blocos_http(filtros: dict, comprimir: bool):
+    """Agrupa as linhas em blocos (opcionalmente gzip) para a resposta em streaming."""
+    from database import SessionLocal
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None  # wbits=31: formato gzip
+    buffer = []
+    tamanho = 0
+    with SessionLocal() as db:
+        for linha in linhas_ndjson(db, **filtros):
+            buffer.append(linha)
+            tamanho += len(linha)
+            if tamanho >= TAMANHO_BLOCO_HTTP:
+                bloco = b"".join(buffer)
+                buffer, tamanho = [], 0
+                if compressor:
+                    bloco = compressor.compress(bloco)
+                if bloco:
+                    yield bloco
+    bloco = b"".join(buffer)
+    if compressor:
+        bloco = compressor.compress(bloco) + compressor.flush()
+    if bloco:
+        yield bloco
+
+
+def registrar_rotas(servidor):
+    """
+    Registra GET /admin/exportar no servidor FastAPI do Chainlit.
+
+    A rota só responde se ADMIN_TOKEN estiver definido, e exige o token no
+    cabeçalho `Authorization: Bearer <token>`.
+
+    Args:
+        servidor: Aplicação FastAPI (chainlit.server.app)
+    """
+    from fastapi import Request, Query
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from rotas import rotas_antes_do_frontend
+
+    with rotas_antes_do_frontend(servidor):
+        @servidor.get("/admin/exportar")
+        async def admin_exportar(request: Request, perfil: str = None, desde: str = None, ate: str = None,
+                                 thread_id: str = None, comprimir: bool = Query(False, alias="gzip")):
+            if not ADMIN_TOKEN:
+                return JSONResponse({"erro": "Exportação desabilitada (ADMIN_TOKEN não configurado)"}, status_code=404)
+            enviado = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+            if not hmac.compare_digest(enviado.encode(), ADMIN_TOKEN.encode()):
+                return JSONResponse({"erro": "Não autorizado"}, status_code=401)
+            try:
+                filtros = {
+                    "perfil": perfil,
+                    "desde": _data(desde),
+                    "ate": _data(ate),
+                    "thread_ids": [thread_id] if thread_id else None,
+                }
+            except ValueError as e:
+                return JSONResponse({"erro": f"Data inválida: {e}"}, status_code=400)
+
+            nome = f"conversas_{datetime.utcnow():%Y%m%d_%H%M%S}.ndjson" + (".gz" if comprimir else "")
+            return StreamingResponse(
+                _blocos_http(filtros, comprimir),  # Gerador síncrono: o Starlette itera em uma thread
+                media_type="application/gzip" if comprimir else "application/x-ndjson",
+                headers={"Content-Disposition": f'attachment; filename="{nome}"'},
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta/importa conversas do GaMi-AI em NDJSON")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_exp = sub.add_parser("exportar", help="Grava as mensagens em NDJSON")
+    p_exp.add_argument("destino", help="Arquivo de saída (.gz comprime)")
+    p_exp.add_argument("--perfil", help="Nome do perfil")
+    p_exp.add_argument("--desde", help="Data/hora mínima (ISO 8601)")
+    p_exp.add_argument("--ate", help="Data/hora máxima, exclusiva (ISO 8601)")
+    p_exp.add_argument("--thread", action="append", dest="threads", help="ID da thread (pode repetir)")
+    p_exp.add_argument("--gzip", action="store_true", default=None, help="Força compressão gzip")
+
+    p_imp = sub.add_parser("importar", help="Importa um arquivo NDJSON exportado")
+    p_imp.add_argument("origem", help="Arquivo de entrada (gzip detectado automaticamente)")
+    p_imp.add_argument("--lote", type=int, default=EXPORTACAO_LOTE, help="Mensagens por INSERT")
+
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    init_db()
+    with SessionLocal() as db:
+        if args.comando == "exportar":
+            total = exportar(
+                db, args.destino, args.gzip,
+                perfil=args.perfil, desde=args.desde, ate=args.ate, thread_ids=args.threads,
+            )
+            print(f"📤 {total} mensagens exportadas para {args.destino}")
+        else:
+            resultado = importar(db, args.origem, args.lote)
+            print(
+                f"✅ {resultado['mensagens']} mensagens importadas em {resultado['threads']} threads "
+                f"({resultado['ignoradas']} já existentes ignoradas)"
+            )
@@ -0,0 +1,191 @@
+"""
+Modo em Lote - Executa o GaMi-AI sobre um arquivo JSONL de conversas.
+
+Cada linha de entrada é um registro {"id"?, "profile", "messages"}, onde
+"messages" é uma lista de dicts com "role" e "content" terminando na mensagem
+do usuário a ser respondida. As respostas são gravadas incrementalmente em um
+JSONL de saída, que também serve de checkpoint: ao reiniciar, as linhas já
+concluídas com sucesso são puladas.
+
+O limite de requisições por minuto é por processo. Com o app no ar, use
+--rpm para reservar ao lote só a parte da cota que o app não usa.
+
+Uso:
+    python lote.py entrada.jsonl saida.jsonl --concorrencia 4 --rpm 20
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import cerebro
+from cerebro import pensar, obter_system_prompt, LimitadorTaxa
+
+
+def carregar_concluidos(caminho_saida: str) -> set:
+    """
+    Lê o arquivo de saída e retorna os IDs já respondidos com sucesso.
+
+    Uma última linha truncada (queda no meio da escrita) é descartada do
+    arquivo para que a retomada continue a partir de um JSONL válido.
+
+    Args:
+        caminho_saida: Caminho do JSONL de saída
+
+    Returns:
+        Conjunto de IDs concluídos
+    """
+    concluidos = set()
+    if not os.path.exists(caminho_saida):
+        return concluidos
+
+    tamanho_valido = 0
+    with open(caminho_saida, "rb") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                break
+            if not linha.endswith(b"\n"):
+                break
+            tamanho_valido += len(linha)
+            if registro.get("status") == "ok":
+                concluidos.add(str(registro.get("id")))
+
+    if tamanho_valido < os.path.getsize(caminho_saida):
+        print(f"⚠️ Linha incompleta no checkpoint, truncando {caminho_saida}")
+        with open(caminho_saida, "r+b") as f:
+            f.truncate(tamanho_valido)
+
+    return concluidos
+
+
+def ler_registros(caminho_entrada: str):
+    """
+    Lê o JSONL de entrada de forma preguiçosa (linha a linha).
+
+    Yields:
+        Tuplas (id, registro); registros sem "id" recebem o número da linha
+    """
+    with open(caminho_entrada, "r", encoding="utf-8") as f:
+        for numero, linha in enumerate(f, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError as e:
+                print(f"⚠️ Linha {numero} ignorada (JSON inválido): {e}")
+                continue
+            if not isinstance(registro, dict):
+                print(f"⚠️ Linha {numero} ignorada (esperado um objeto JSON, veio {type(registro).__name__})")
+                continue
+            yield str(registro.get("id", f"linha-{numero}")), registro
+
+
+def preparar_chamada(registro: dict):
+    """
+    Converte um registro {profile, messages} nos argumentos de `pensar`.
+
+    Returns:
+        Tupla (mensagem, system_prompt, historico)
+    """
+    mensagens = registro.get("messages") or []
+    if not mensagens or mensagens[-1].get("role") != "user":
+        raise ValueError("'messages' deve terminar com uma mensagem do usuário")
+
+    system_prompt = obter_system_prompt(registro.get("profile", "modo_geral"))
+    historico = []
+    for msg in mensagens[:-1]:
+        if msg.get("role") == "system":
+            system_prompt = msg.get("content", system_prompt)
+        else:
+            historico.append(msg)
+
+    return mensagens[-1].get("content", ""), system_prompt, historico
+
+
+async def processar_registro(id_registro: str, registro: dict) -> dict:
+    """Executa `pensar` para um registro e monta a linha de saída."""
+    inicio = time.perf_counter()
+    resultado = {"id": id_registro, "profile": registro.get("profile", "modo_geral")}
+    try:
+        mensagem, system_prompt, historico = preparar_chamada(registro)
+        resposta = await asyncio.to_thread(pensar, mensagem, system_prompt, historico)
+        resultado.update(status="ok", resposta=resposta)
+    except Exception as e:
+        resultado.update(status="erro", erro=str(e)[:500])
+    resultado["latencia_s"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+async def executar_lote(caminho_entrada: str, caminho_saida: str, concorrencia: int = 4) -> dict:
+    """
+    Processa o arquivo de entrada com concorrência limitada.
+
+    No máximo `concorrencia` registros ficam em voo ao mesmo tempo, então o
+    consumo de memória não depende do tamanho da entrada. Cada resultado é
+    gravado e sincronizado em disco assim que fica pronto.
+
+    Returns:
+        Contadores {"ok", "erro", "pulados"}
+    """
+    concluidos = carregar_concluidos(caminho_saida)
+    contadores = {"ok": 0, "erro": 0, "pulados": 0}
+    semaforo = asyncio.Semaphore(max(1, concorrencia))
+    pendentes = set()
+
+    with open(caminho_saida, "a", encoding="utf-8") as saida:
+
+        async def executar(id_registro, registro):
+            try:
+                resultado = await processar_registro(id_registro, registro)
+                saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                saida.flush()
+                os.fsync(saida.fileno())
+                contadores[resultado["status"]] += 1
+                if resultado["status"] == "erro":
+                    print(f"❌ {id_registro}: {resultado['erro'][:200]}")
+            finally:
+                semaforo.release()
+
+        for id_registro, registro in ler_registros(caminho_entrada):
+            if id_registro in concluidos:
+                contadores["pulados"] += 1
+                continue
+            await semaforo.acquire()
+            tarefa = asyncio.create_task(executar(id_registro, registro))
+            pendentes.add(tarefa)
+            tarefa.add_done_callback(pendentes.discard)
+
+        if pendentes:
+            await asyncio.gather(*pendentes)
+
+    return contadores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa o GaMi-AI sobre um lote JSONL")
+    parser.add_argument("entrada", help="JSONL com registros {profile, messages}")
+    parser.add_argument("saida", help="JSONL de saída (também usado como checkpoint)")
+    parser.add_argument("--concorrencia", type=int, default=int(os.getenv("LOTE_CONCORRENCIA", "4")),
+                        help="Número máximo de chamadas simultâneas ao modelo")
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("LOTE_REQUISICOES_POR_MINUTO", "0")),
+                        help="Requisições por minuto deste processo (padrão: LLM_REQUISICOES_POR_MINUTO)")
+    args = parser.parse_args(argv)
+
+    if args.rpm > 0:
+        cerebro.LIMITADOR = LimitadorTaxa(args.rpm)
+
+    inicio = time.perf_counter()
+    contadores = asyncio.run(executar_lote(args.entrada, args.saida, args.concorrencia))
+    duracao = time.perf_counter() - inicio
+    print(
+        f"✅ Lote concluído em {duracao:.1f}s | ok: {contadores['ok']} | "
+        f"erros: {contadores['erro']} | pulados: {contadores['pulados']}"
+    )
+    return 1 if contadores["erro"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
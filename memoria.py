@@ -0,0 +1,407 @@
+"""
+Memória de Longo Prazo - Recupera trechos relevantes de conversas anteriores.
+
+As mensagens salvas em `messages` são convertidas em vetores por um embedder
+plugável (por padrão um embedder local por hashing, sem rede) e guardadas em
+uma matriz NumPy mapeada em disco, atualizada incrementalmente. A cada turno
+os top-k trechos mais parecidos com a pergunta entram no prompt, no lugar de
+reenviar o histórico inteiro.
+
+A busca só enxerga mensagens do mesmo dono: as da thread atual (fora da
+janela já enviada) e, se a sessão tiver usuário autenticado, as das outras
+threads desse usuário. Mensagens sem dono nunca aparecem em outra thread.
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from sqlalchemy.orm import undefer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEMORIA_DIR = os.getenv("MEMORIA_DIR", "memoria_index")
+MEMORIA_TOP_K = int(os.getenv("MEMORIA_TOP_K", "4"))
+MEMORIA_SCORE_MINIMO = float(os.getenv("MEMORIA_SCORE_MINIMO", "0.2"))
+MEMORIA_MIN_CARACTERES = 20  # Mensagens curtas ("ok", "obrigado") não ajudam
+# Ids abaixo do último indexado relidos a cada sincronização: no PostgreSQL,
+# backups concorrentes podem fazer commit fora da ordem dos ids
+MEMORIA_RELEITURA = int(os.getenv("MEMORIA_RELEITURA", "256"))
+TAMANHO_TRECHO = 600  # Caracteres de cada lembrança colocados no prompt
+LINHAS_POR_BLOCO = 262144  # Linhas da matriz lidas por vez na busca
+VERSAO_INDICE = 2  # v2: coluna de dono (owners.i64)
+SEM_DONO = 0  # Hash gravado para mensagens sem usuário autenticado
+
+
+def hash_estavel(texto: str) -> int:
+    """Hash de 64 bits estável entre processos (ao contrário de `hash()`)."""
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def hash_dono(dono: str) -> int:
+    """Hash do dono (nunca igual a SEM_DONO para um dono real)."""
+    if not dono:
+        return SEM_DONO
+    return hash_estavel(dono) or 1
+
+
+class EmbedderHash:
+    """
+    Embedder local por "hashing trick": cada palavra e bigrama cai em uma das
+    `dim` posições (com sinal), com peso log(1 + tf) e normalização L2.
+
+    Não precisa de rede nem de modelo, então serve para uso offline e testes.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _atributos(self, texto: str) -> list:
+        palavras = re.findall(r"\w+", texto.lower())
+        return palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]
+
+    def embed(self, textos: list) -> np.ndarray:
+        """
+        Converte uma lista de textos em uma matriz (len(textos), dim) float32.
+        """
+        linhas, colunas, valores = [], [], []
+        for i, texto in enumerate(textos):
+            contagem = {}
+            for atributo in self._atributos(texto):
+                h = hash_estavel(atributo)
+                chave = (h % self.dim, 1.0 if h & (1 << 40) else -1.0)
+                contagem[chave] = contagem.get(chave, 0) + 1
+            for (coluna, sinal), tf in contagem.items():
+                linhas.append(i)
+                colunas.append(coluna)
+                valores.append(sinal * np.log1p(tf))
+
+        matriz = np.zeros((len(textos), self.dim), dtype=np.float32)
+        if valores:
+            np.add.at(matriz, (np.array(linhas), np.array(colunas)), np.array(valores, dtype=np.float32))
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        np.divide(matriz, normas, out=matriz, where=normas > 0)
+        return matriz
+
+
+class EmbedderOpenAI:
+    """
+    Embedder remoto usando a API de embeddings da OpenAI (maior qualidade,
+    custo por token). Ative com MEMORIA_EMBEDDER=openai.
+    """
+
+    def __init__(self, modelo: str = "text-embedding-3-small", dim: int = 256):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.modelo = modelo
+        self.dim = dim
+
+    def embed(self, textos: list) -> np.ndarray:
+        resposta = self.client.embeddings.create(model=self.modelo, input=textos, dimensions=self.dim)
+        matriz = np.array([item.embedding for item in resposta.data], dtype=np.float32)
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        np.divide(matriz, normas, out=matriz, where=normas > 0)
+        return matriz
+
+
+def criar_embedder():
+    """Cria o embedder configurado em MEMORIA_EMBEDDER (hash ou openai)."""
+    dim = int(os.getenv("MEMORIA_DIM", "256"))
+    if os.getenv("MEMORIA_EMBEDDER", "hash").lower() == "openai":
+        return EmbedderOpenAI(dim=dim)
+    return EmbedderHash(dim=dim)
+
+
+class IndiceVetorial:
+    """
+    Matriz de vetores mapeada em disco, com crescimento incremental.
+
+    Arquivos no diretório:
+        vetores.f32  - matriz (capacidade, dim) float32
+        ids.i64      - id da mensagem de cada linha
+        threads.i64  - hash da thread de cada linha
+        owners.i64   - hash do dono de cada linha (SEM_DONO se não houver)
+        meta.json    - versão, dim, embedder, linhas usadas e último id indexado
+    """
+
+    def __init__(self, diretorio: str, dim: int, embedder_nome: str = ""):
+        self.dir = Path(diretorio)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.meta = {
+            "versao": VERSAO_INDICE, "dim": dim, "embedder": embedder_nome,
+            "tamanho": 0, "capacidade": 0, "ultimo_id": 0,
+        }
+
+        caminho_meta = self.dir / "meta.json"
+        if caminho_meta.exists():
+            meta = json.loads(caminho_meta.read_text())
+            if (meta.get("versao") == VERSAO_INDICE and meta.get("dim") == dim
+                    and meta.get("embedder") == embedder_nome):
+                self.meta = meta
+            else:
+                print("🔄 Formato ou embedder da memória mudou, reconstruindo índice")
+        self._abrir(self.meta["capacidade"])
+
+    @property
+    def tamanho(self) -> int:
+        return self.meta["tamanho"]
+
+    @property
+    def ultimo_id(self) -> int:
+        return self.meta["ultimo_id"]
+
+    def _mapear(self, nome, dtype, formato, modo):
+        return np.memmap(self.dir / nome, dtype=dtype, mode=modo, shape=formato)
+
+    def _abrir(self, capacidade: int):
+        """(Re)abre os memmaps com a capacidade pedida, criando/crescendo os arquivos."""
+        dim = self.meta["dim"]
+        if capacidade == 0:
+            self.vetores = np.zeros((0, dim), dtype=np.float32)
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.threads = np.zeros(0, dtype=np.int64)
+            self.donos = np.zeros(0, dtype=np.int64)
+            return
+        for nome, largura in (("vetores.f32", dim * 4), ("ids.i64", 8), ("threads.i64", 8), ("owners.i64", 8)):
+            caminho = self.dir / nome
+            with open(caminho, "ab") as f:
+                f.truncate(capacidade * largura)
+        self.vetores = self._mapear("vetores.f32", np.float32, (capacidade, dim), "r+")
+        self.ids = self._mapear("ids.i64", np.int64, (capacidade,), "r+")
+        self.threads = self._mapear("threads.i64", np.int64, (capacidade,), "r+")
+        self.donos = self._mapear("owners.i64", np.int64, (capacidade,), "r+")
+        self.meta["capacidade"] = capacidade
+
+    def adicionar(self, vetores: np.ndarray, ids: list, threads: list, donos: list, ultimo_id: int):
+        """
+        Acrescenta vetores ao fim da matriz (dobrando a capacidade quando preciso).
+        """
+        with self.lock:
+            n = len(ids)
+            inicio = self.meta["tamanho"]
+            if inicio + n > self.meta["capacidade"]:
+                for arr in (self.vetores, self.ids, self.threads, self.donos):
+                    if isinstance(arr, np.memmap):
+                        arr.flush()
+                self._abrir(max(1024, 2 * self.meta["capacidade"], inicio + n))
+            if n:
+                self.vetores[inicio:inicio + n] = vetores
+                self.ids[inicio:inicio + n] = ids
+                self.threads[inicio:inicio + n] = threads
+                self.donos[inicio:inicio + n] = donos
+                for arr in (self.vetores, self.ids, self.threads, self.donos):
+                    arr.flush()
+            self.meta["tamanho"] = inicio + n
+            self.meta["ultimo_id"] = max(self.meta["ultimo_id"], ultimo_id)
+            (self.dir / "meta.json").write_text(json.dumps(self.meta))
+
+    def ids_recentes(self, minimo: int, linhas: int) -> set:
+        """
+        Ids maiores que `minimo` entre as últimas `linhas` linhas do índice.
+
+        A sincronização só adiciona ids acima de (último indexado - releitura),
+        então os ids altos ficam sempre no fim da matriz.
+        """
+        with self.lock:
+            tamanho = self.meta["tamanho"]
+            fim = self.ids[max(0, tamanho - linhas):tamanho]
+            return set(fim[fim > minimo].tolist())
+
+    def buscar(self, consulta: np.ndarray, k: int, thread: int, dono: int = SEM_DONO,
+               excluir_ids: list = None) -> list:
+        """
+        Retorna os `k` vizinhos mais próximos por produto interno (cosseno, já
+        que os vetores são normalizados), varrendo a matriz em blocos.
+
+        Só considera linhas da `thread` informada ou, se `dono` for um dono
+        real, de qualquer thread desse dono.
+
+        Args:
+            consulta: Vetor da pergunta
+            k: Quantidade de vizinhos
+            thread: Hash da thread atual
+            dono: Hash do dono da sessão (SEM_DONO: só a thread atual)
+            excluir_ids: Ids de mensagens a ignorar (ex.: as que já estão no prompt)
+
+        Returns:
+            Lista de tuplas (id_mensagem, score), do mais parecido ao menos
+        """
+        with self.lock:
+            tamanho = self.meta["tamanho"]
+            vetores, ids, threads, donos = self.vetores, self.ids, self.threads, self.donos
+        if tamanho == 0 or k <= 0:
+            return []
+        excluir = np.array(excluir_ids or [], dtype=np.int64)
+
+        melhores_scores = np.empty(0, dtype=np.float32)
+        melhores_ids = np.empty(0, dtype=np.int64)
+        for inicio in range(0, tamanho, LINHAS_POR_BLOCO):
+            fim = min(tamanho, inicio + LINHAS_POR_BLOCO)
+            scores = vetores[inicio:fim] @ consulta
+            permitidas = threads[inicio:fim] == thread
+            if dono != SEM_DONO:
+                permitidas |= donos[inicio:fim] == dono
+            if len(excluir):
+                permitidas &= ~np.isin(ids[inicio:fim], excluir)
+            scores[~permitidas] = -np.inf
+            if len(scores) > k:
+                topo = np.argpartition(scores, -k)[-k:]
+            else:
+                topo = np.arange(len(scores))
+            melhores_scores = np.concatenate([melhores_scores, scores[topo]])
+            melhores_ids = np.concatenate([melhores_ids, ids[inicio:fim][topo]])
+
+        ordem = np.argsort(-melhores_scores)[:k]
+        return [(int(melhores_ids[i]), float(melhores_scores[i])) for i in ordem if np.isfinite(melhores_scores[i])]
+
+
+class MemoriaLongoPrazo:
+    """
+    Liga o índice vetorial à tabela `messages`.
+    """
+
+    def __init__(self, indice: IndiceVetorial, embedder, session_factory):
+        self.indice = indice
+        self.embedder = embedder
+        self.session_factory = session_factory
+        self._lock_sync = threading.Lock()
+
+    def sincronizar(self, lote: int = 512) -> int:
+        """
+        Indexa as mensagens novas.
+
+        Parte de MEMORIA_RELEITURA ids abaixo do último indexado e ignora os
+        que já estão no índice: uma mensagem com id menor cujo commit chegou
+        depois de um id maior (backups concorrentes) ainda é indexada.
+
+        Returns:
+            Quantidade de mensagens novas indexadas
+        """
+        from models import Message
+
+        if not self._lock_sync.acquire(blocking=False):
+            return 0  # Outra sincronização já está em andamento
+        total = 0
+        try:
+            inicio = max(0, self.indice.ultimo_id - MEMORIA_RELEITURA)
+            indexados = self.indice.ids_recentes(inicio, 2 * MEMORIA_RELEITURA + lote)
+            while True:
+                with self.session_factory() as db:
+                    linhas = db.query(Message).options(undefer(Message.content_z)).filter(
+                        Message.id > inicio
+                    ).order_by(Message.id).limit(lote).all()
+                    registros = [(m.id, m.thread_id, m.owner_id, m.content or "") for m in linhas]
+                if not registros:
+                    return total
+                inicio = registros[-1][0]
+
+                uteis = [
+                    r for r in registros
+                    if r[0] not in indexados and len(r[3].strip()) >= MEMORIA_MIN_CARACTERES
+                ]
+                vetores = self.embedder.embed([r[3][:4000] for r in uteis]) if uteis else None
+                self.indice.adicionar(
+                    vetores,
+                    [r[0] for r in uteis],
+                    [hash_estavel(r[1]) for r in uteis],
+                    [hash_dono(r[2]) for r in uteis],
+                    ultimo_id=registros[-1][0],
+                )
+                total += len(uteis)
+                if len(registros) < lote:
+                    return total
+        finally:
+            self._lock_sync.release()
+
+    def buscar(self, texto: str, thread_atual: str, dono: str = None, janela: int = 0, k: int = None) -> list:
+        """
+        Busca lembranças relevantes para `texto` entre as mensagens do mesmo dono.
+
+        Args:
+            texto: Pergunta atual
+            thread_atual: Thread da sessão (sempre pesquisável, fora da janela)
+            dono: Usuário autenticado da sessão; sem ele, só a thread atual é pesquisada
+            janela: Quantas mensagens finais da thread já vão no prompt (ficam de fora)
+            k: Quantidade de lembranças
+
+        Returns:
+            Lista de dicts {role, content, created_at, score, thread_id}
+        """
+        from models import Message
+
+        k = k or MEMORIA_TOP_K
+        excluir_ids = []
+        if janela > 0:
+            with self.session_factory() as db:
+                excluir_ids = [i for (i,) in db.query(Message.id).filter(
+                    Message.thread_id == thread_atual
+                ).order_by(Message.id.desc()).limit(janela)]
+        consulta = self.embedder.embed([texto])[0]
+        # Busca folgada: respostas repetidas entre threads são descartadas abaixo
+        vizinhos = [
+            (i, s) for i, s in self.indice.buscar(
+                consulta, k * 3, hash_estavel(thread_atual or ""), hash_dono(dono), excluir_ids
+            )
+            if s >= MEMORIA_SCORE_MINIMO
+        ]
+        if not vizinhos:
+            return []
+
+        scores = dict(vizinhos)
+        with self.session_factory() as db:
+            linhas = db.query(Message).options(undefer(Message.content_z)).filter(
+                Message.id.in_(list(scores))
+            ).all()
+            lembrancas = [
+                {
+                    "role": m.role,
+                    "content": (m.content or "")[:TAMANHO_TRECHO],
+                    "created_at": m.created_at,
+                    "score": scores[m.id],
+                    "thread_id": m.thread_id,
+                }
+                for m in linhas
+            ]
+        unicas = {}
+        for l in sorted(lembrancas, key=lambda l: l["score"], reverse=True):
+            unicas.setdefault(l["content"].strip().lower(), l)
+        return list(unicas.values())[:k]
+
+    def contexto_para(self, texto: str, thread_atual: str, dono: str = None, janela: int = 0) -> str:
+        """
+        Monta o bloco de contexto (para o system prompt) com as lembranças relevantes.
+
+        Returns:
+            Texto pronto para o prompt, ou string vazia se nada for relevante
+        """
+        lembrancas = self.buscar(texto, thread_atual, dono, janela)
+        if not lembrancas:
+            return ""
+        linhas = ["Trechos relevantes de mensagens anteriores deste usuário (use se ajudarem):"]
+        for l in lembrancas:
+            quando = l["created_at"].strftime("%d/%m/%Y") if l["created_at"] else "?"
+            quem = "Usuário" if l["role"] == "user" else "GaMi"
+            origem = "esta conversa" if l["thread_id"] == thread_atual else "outra conversa"
+            linhas.append(f"- [{quando}, {origem}] {quem}: {l['content']}")
+        return "\n".join(linhas)
+
+
+_memoria = None
+_lock_memoria = threading.Lock()
+
+
+def obter_memoria() -> MemoriaLongoPrazo:
+    """Retorna a memória do processo (criada na primeira chamada)."""
+    global _memoria
+    if _memoria is None:
+        with _lock_memoria:
+            if _memoria is None:
+                from database import SessionLocal
+                embedder = criar_embedder()
+                indice = IndiceVetorial(MEMORIA_DIR, embedder.dim, type(embedder).__name__)
+                _memoria = MemoriaLongoPrazo(indice, embedder, SessionLocal)
+    return _memoria
@@ -1,10 +1,11 @@
 """
 Modelos SQLAlchemy para persistência de dados
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, LargeBinary, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
+from compressao import comprimir, descomprimir
 
 Base = declarative_base()
 
@@ -32,11 +33,123 @@ class Message(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     thread_id = Column(String(255), nullable=False, index=True)  # ID da thread/sessão do Chainlit
+    owner_id = Column(String(255), nullable=True, index=True)  # Usuário autenticado (None = sessão anônima)
     profile_id = Column(Integer, ForeignKey("chat_profiles.id"), nullable=True)
     role = Column(String(20), nullable=False)  # 'user' ou 'assistant'
-    content = Column(Text, nullable=False)
+    _content = Column("content", Text, nullable=False, default="")  # Texto puro (mensagens pequenas/antigas)
+    content_z = deferred(Column(LargeBinary, nullable=True))  # Corpo comprimido, só carregado quando lido
+    codec = Column(String(16), nullable=True)  # None = texto puro em `content`
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relacionamento com perfil
     profile = relationship("ChatProfile", back_populates="messages")
+    
+    @property
+    def content(self) -> str:
+        """Conteúdo da mensagem, descomprimido sob demanda (e só uma vez)."""
+        if not self.codec:
+            return self._content
+        cache = self.__dict__.get("_content_cache")
+        if cache is None:
+            cache = descomprimir(self.content_z, self.codec)
+            self.__dict__["_content_cache"] = cache
+        return cache
+    
+    @content.setter
+    def content(self, valor: str):
+        dados, codec = comprimir(valor)
+        self.__dict__.pop("_content_cache", None)
+        if dados is None:
+            self._content = valor
+            self.content_z = None
+            self.codec = None
+        else:
+            self._content = ""
+            self.content_z = dados
+            self.codec = codec
+
+
+
+class ThreadSummary(Base):
+    """
+    Índice materializado de conversas (uma linha por thread, mantida a cada backup)
+    """
+    __tablename__ = "thread_summaries"
+    __table_args__ = (
+        # Paginação de "conversas recentes" por keyset (last_message_at, thread_id)
+        Index("ix_thread_summaries_recent", "last_message_at", "thread_id"),
+        Index("ix_thread_summaries_profile_recent", "profile_id", "last_message_at", "thread_id"),
+        # "Minhas conversas": mesma paginação, restrita a um dono
+        Index("ix_thread_summaries_owner_recent", "owner_id", "last_message_at", "thread_id"),
+    )
+    
+    thread_id = Column(String(255), primary_key=True)
+    profile_id = Column(Integer, ForeignKey("chat_profiles.id"), nullable=True)
+    owner_id = Column(String(255), nullable=True)  # Usuário autenticado dono da thread
+    title = Column(String(200), nullable=True)  # Início da primeira mensagem do usuário
+    message_count = Column(Integer, default=0, nullable=False)
+    user_message_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_message_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class UsageTurn(Base):
+    """
+    Modelo para o ledger de uso (uma linha por turno: tokens, voz e latências)
+    """
+    __tablename__ = "usage_turns"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    thread_id = Column(String(255), nullable=True, index=True)
+    profile_id = Column(Integer, ForeignKey("chat_profiles.id"), nullable=True)
+    model = Column(String(100), nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    tts_chars = Column(Integer, default=0)
+    stt_seconds = Column(Float, default=0.0)
+    latency_stt_ms = Column(Integer, nullable=True)
+    latency_llm_ms = Column(Integer, nullable=True)
+    latency_tts_ms = Column(Integer, nullable=True)
+    latency_total_ms = Column(Integer, nullable=True)  # Até o texto chegar ao usuário
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 
+class UsageProfileHourly(Base):
+    """
+    Agregado de uso por perfil/modelo em janelas de uma hora (atualizado incrementalmente)
+    """
+    __tablename__ = "usage_profile_hourly"
+    __table_args__ = (UniqueConstraint("bucket", "profile_id", "model", name="uq_usage_profile_hourly"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(DateTime, nullable=False, index=True)  # Início da hora (UTC)
+    profile_id = Column(Integer, ForeignKey("chat_profiles.id"), nullable=True)
+    model = Column(String(100), nullable=True)
+    turns = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    tts_chars = Column(Integer, default=0)
+    stt_seconds = Column(Float, default=0.0)
+    latency_total_ms_sum = Column(Integer, default=0)
+    latency_total_ms_max = Column(Integer, default=0)
+
+
+class UsageThread(Base):
+    """
+    Agregado de uso por thread (atualizado incrementalmente)
+    """
+    __tablename__ = "usage_threads"
+    
+    thread_id = Column(String(255), primary_key=True)
+    profile_id = Column(Integer, ForeignKey("chat_profiles.id"), nullable=True)
+    turns = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)
+    tts_chars = Column(Integer, default=0)
+    stt_seconds = Column(Float, default=0.0)
+    latency_total_ms_sum = Column(Integer, default=0)
+    latency_total_ms_max = Column(Integer, default=0, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,233 @@
+"""
+Modo Multiagente - Fan-out paralelo para perguntas do Modo Consultor.
+
+A pergunta é quebrada em análises independentes (mercado, riscos, operações)
+executadas ao mesmo tempo, e uma chamada final de síntese junta tudo em uma
+resposta única. O tempo total fica próximo ao do ramo mais lento, não à soma.
+
+Executores disponíveis (MULTIAGENTE_BACKEND):
+    llm     - chamadas diretas ao modelo de cerebro.py (padrão)
+    crewai  - cada ramo vira um agente/tarefa do CrewAI
+    stub    - respostas simuladas locais, para testes sem rede
+
+Uso:
+    python multiagente.py "Como expandir minha loja para o e-commerce?" --stub
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage, SystemMessage
+from cerebro import criar_llm, invocar_com_politica, extrair_uso, obter_system_prompt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONSULTOR_FANOUT = os.getenv("CONSULTOR_FANOUT", "0") == "1"
+MULTIAGENTE_BACKEND = os.getenv("MULTIAGENTE_BACKEND", "llm").lower()
+
+# Ramos de análise do Modo Consultor (cada um roda em paralelo)
+RAMOS_CONSULTOR = [
+    {
+        "nome": "mercado",
+        "papel": "Analista de Mercado",
+        "objetivo": "Avaliar mercado, clientes, concorrência e oportunidades de crescimento",
+        "instrucoes": "Foque apenas em mercado: tamanho e segmentos, perfil de clientes, concorrentes, "
+                      "posicionamento e oportunidades. Seja objetivo, em tópicos.",
+    },
+    {
+        "nome": "riscos",
+        "papel": "Analista de Riscos",
+        "objetivo": "Identificar riscos financeiros, regulatórios, operacionais e de execução",
+        "instrucoes": "Foque apenas em riscos: liste os principais, com probabilidade, impacto e "
+                      "mitigação de cada um. Seja objetivo, em tópicos.",
+    },
+    {
+        "nome": "operacoes",
+        "papel": "Especialista em Operações",
+        "objetivo": "Desenhar a execução: processos, recursos, custos, prazos e métricas",
+        "instrucoes": "Foque apenas em operações: processos, equipe e recursos, custos estimados, "
+                      "cronograma e indicadores de acompanhamento. Seja objetivo, em tópicos.",
+    },
+]
+
+RAMO_SINTESE = {
+    "nome": "sintese",
+    "papel": "Consultor Sênior",
+    "objetivo": "Consolidar as análises em uma recomendação executiva única",
+    "instrucoes": "Você recebe análises independentes de especialistas. Consolide-as em uma única "
+                  "resposta executiva: diagnóstico, recomendações priorizadas e próximos passos. "
+                  "Resolva contradições e não repita conteúdo.",
+}
+
+
+def _system_prompt_ramo(ramo: dict) -> str:
+    return (
+        f"{obter_system_prompt('modo_consultor')}\n\n"
+        f"Nesta tarefa você atua como **{ramo['papel']}**. Objetivo: {ramo['objetivo']}.\n"
+        f"{ramo['instrucoes']}"
+    )
+
+
+def executor_llm(ramo: dict, conteudo: str, uso: dict) -> str:
+    """Executa um ramo com o mesmo modelo, limite de taxa e retry de `pensar`."""
+    llm = criar_llm()
+    uso["model"] = llm.model_name
+    response = invocar_com_politica(llm, [
+        SystemMessage(content=_system_prompt_ramo(ramo)),
+        HumanMessage(content=conteudo),
+    ])
+    extrair_uso(response, uso)
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def executor_crewai(ramo: dict, conteudo: str, uso: dict) -> str:
+    """Executa um ramo como um agente do CrewAI (uma tarefa por crew)."""
+    from crewai import Agent, Task, Crew, LLM
+
+    llm_base = criar_llm()
+    uso["model"] = llm_base.model_name
+    agente = Agent(
+        role=ramo["papel"],
+        goal=ramo["objetivo"],
+        backstory=_system_prompt_ramo(ramo),
+        llm=LLM(
+            model=f"openai/{llm_base.model_name}",
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        ),
+        allow_delegation=False,
+        verbose=False,
+    )
+    tarefa = Task(
+        description=conteudo,
+        expected_output=ramo["instrucoes"],
+        agent=agente,
+    )
+    resultado = Crew(agents=[agente], tasks=[tarefa], verbose=False).kickoff()
+    uso_crew = getattr(resultado, "token_usage", None)
+    if uso_crew is not None:
+        uso["prompt_tokens"] = getattr(uso_crew, "prompt_tokens", 0)
+        uso["completion_tokens"] = getattr(uso_crew, "completion_tokens", 0)
+        uso["cached_tokens"] = getattr(uso_crew, "cached_prompt_tokens", 0)
+    return str(resultado)
+
+
+class ExecutorStub:
+    """
+    Executor local que não chama rede: devolve um texto simulado após `atraso`
+    segundos (por ramo). Serve para testar o paralelismo e a montagem da resposta.
+    """
+
+    def __init__(self, atraso: float = 0.0, atrasos: dict = None):
+        self.atraso = atraso
+        self.atrasos = atrasos or {}
+
+    def __call__(self, ramo: dict, conteudo: str, uso: dict) -> str:
+        time.sleep(self.atrasos.get(ramo["nome"], self.atraso))
+        uso["model"] = "stub"
+        return f"[{ramo['papel']}] análise simulada ({len(conteudo)} caracteres de entrada)."
+
+
+def obter_executor(backend: str = None):
+    """Retorna o executor configurado em MULTIAGENTE_BACKEND."""
+    backend = (backend or MULTIAGENTE_BACKEND).lower()
+    if backend == "crewai":
+        return executor_crewai
+    if backend == "stub":
+        return ExecutorStub()
+    return executor_llm
+
+
+def _contexto_historico(historico: list, maximo: int = 6) -> str:
+    if not historico:
+        return ""
+    linhas = []
+    for msg in historico[-maximo:]:
+        quem = "Usuário" if msg.get("role") == "user" else "Assistente"
+        linhas.append(f"{quem}: {msg.get('content', '')[:1000]}")
+    return "Contexto da conversa até aqui:\n" + "\n".join(linhas) + "\n\n"
+
+
+def consultar_em_paralelo(pergunta: str, historico: list = None, executor=None, ramos: list = None,
+                          metricas: dict = None, contexto: str = None) -> dict:
+    """
+    Responde uma pergunta do Modo Consultor com análises paralelas + síntese.
+
+    Args:
+        pergunta: Pergunta do usuário
+        historico: Histórico recente (lista de dicts com "role" e "content")
+        executor: Função (ramo, conteudo, uso) -> texto (padrão: MULTIAGENTE_BACKEND)
+        ramos: Ramos de análise (padrão: RAMOS_CONSULTOR)
+        metricas: Dict opcional preenchido com tokens somados e latência (ledger de uso)
+        contexto: Lembranças de conversas anteriores (memória de longo prazo), opcional
+
+    Returns:
+        Dict {"resposta", "tempos": {ramo: segundos, "sintese", "total"}, "falhas": {ramo: erro}}
+    """
+    executor = executor or obter_executor()
+    ramos = ramos or RAMOS_CONSULTOR
+    conteudo = f"{_contexto_historico(historico)}Pergunta: {pergunta}"
+    if contexto:
+        conteudo = f"{contexto}\n\n{conteudo}"
+    inicio_total = time.perf_counter()
+    tempos, falhas, analises, usos = {}, {}, {}, []
+
+    def executar_ramo(ramo):
+        uso = {}
+        inicio = time.perf_counter()
+        try:
+            return ramo["nome"], executor(ramo, conteudo, uso), None, uso, time.perf_counter() - inicio
+        except Exception as e:
+            return ramo["nome"], None, str(e), uso, time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=len(ramos)) as pool:
+        for nome, texto, erro, uso, duracao in pool.map(executar_ramo, ramos):
+            tempos[nome] = round(duracao, 3)
+            usos.append(uso)
+            if erro:
+                falhas[nome] = erro
+                print(f"⚠️ Ramo '{nome}' falhou: {erro[:200]}")
+            else:
+                analises[nome] = texto
+
+    if not analises:
+        raise Exception(f"Todas as análises paralelas falharam: {falhas}")
+
+    blocos = [f"### Análise de {nome}\n{texto}" for nome, texto in analises.items()]
+    if falhas:
+        blocos.append(f"(Análises indisponíveis: {', '.join(falhas)})")
+    conteudo_sintese = f"{conteudo}\n\n" + "\n\n".join(blocos)
+
+    uso_sintese = {}
+    inicio = time.perf_counter()
+    resposta = executor(RAMO_SINTESE, conteudo_sintese, uso_sintese)
+    tempos["sintese"] = round(time.perf_counter() - inicio, 3)
+    usos.append(uso_sintese)
+    tempos["total"] = round(time.perf_counter() - inicio_total, 3)
+
+    print("🧩 Fan-out consultor: " + " | ".join(f"{nome}: {seg:.2f}s" for nome, seg in tempos.items()))
+
+    if metricas is not None:
+        for campo in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            metricas[campo] = sum(u.get(campo, 0) or 0 for u in usos)
+        metricas["model"] = uso_sintese.get("model")
+        metricas["latency_llm_ms"] = int(tempos["total"] * 1000)
+
+    return {"resposta": resposta, "tempos": tempos, "falhas": falhas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o fan-out do Modo Consultor")
+    parser.add_argument("pergunta", help="Pergunta de negócios")
+    parser.add_argument("--stub", action="store_true", help="Usa o executor local simulado (sem rede)")
+    parser.add_argument("--atraso", type=float, default=1.0, help="Atraso por ramo do executor simulado")
+    args = parser.parse_args()
+
+    executor_cli = ExecutorStub(atraso=args.atraso) if args.stub else obter_executor()
+    resultado = consultar_em_paralelo(args.pergunta, executor=executor_cli)
+    print(resultado["resposta"])
+    soma_ramos = sum(seg for nome, seg in resultado["tempos"].items() if nome not in ("sintese", "total"))
+    print(f"\n⏱️ Total: {resultado['tempos']['total']:.2f}s (soma sequencial dos ramos seria {soma_ramos:.2f}s)")
+    sys.exit(1 if resultado["falhas"] else 0)
@@ -0,0 +1,295 @@
+"""
+Perfilador de Memória - Sessões longas sintéticas com tracemalloc.
+
+Simula conversas longas passando por `processar_interacao` (o mesmo caminho
+do chat), com o Chainlit substituído por uma sessão falsa em memória e o
+provedor do LLM substituído por um stub local (sem rede). Todo o resto roda
+de verdade: montagem do prompt, criação do ChatOpenAI, backup no banco,
+ledger de uso e memória de longo prazo.
+
+Depois das sessões medidas roda uma sessão de diagnóstico com snapshots a
+cada N turnos (fora da medição: os próprios snapshots ocupam memória); o
+relatório mostra os pontos do código que mais cresceram, a memória retida
+por sessão encerrada e o crescimento por turno. O processo termina com
+código 1 se passar de qualquer um dos dois orçamentos (mediana entre as
+sessões medidas):
+
+- retida por turno: o que sobra depois que a sessão é encerrada (vazamento);
+- viva por turno: quanto a sessão cresce a cada turno enquanto está aberta
+  (histórico, caches por sessão), que é o que limita sessões longas.
+
+Antes da medição rodam sessões de aquecimento (--aquecimento): pools,
+conexões por thread e caches do SQLAlchemy/sqlite3 só estabilizam depois
+delas. Se a primeira sessão medida ainda retiver bem mais que as outras,
+aumente o aquecimento.
+
+O banco e o índice de memória são criados em um diretório temporário.
+
+Uso:
+    python perfilador.py --sessoes 5 --turnos 200 --orcamento 2048 --orcamento-vivo 8192
+"""
+import os
+import gc
+import sys
+import time
+import asyncio
+import uuid
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+# Ignora no relatório as alocações do próprio tracemalloc e do import de módulos
+FILTROS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class SessaoFalsa(dict):
+    """Substitui `cl.user_session` (get/set por sessão)."""
+
+    def set(self, chave, valor):
+        self[chave] = valor
+
+
+class MensagemFalsa:
+    """Substitui `cl.Message`: aceita os mesmos argumentos e não envia nada."""
+
+    def __init__(self, content="", elements=None, actions=None, **kwargs):
+        self.content = content
+        self.elements = elements or []
+        self.actions = actions or []
+        self.id = str(uuid.uuid4())
+
+    async def send(self):
+        return self
+
+    async def update(self):
+        return self
+
+    async def remove(self):
+        return None
+
+
+class ElementoFalso:
+    """Substitui `cl.Action` e `cl.Audio`."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class ChainlitFalso:
+    """Expõe só o que `processar_interacao` usa do módulo `chainlit`."""
+
+    Message = MensagemFalsa
+    Action = ElementoFalso
+    Audio = ElementoFalso
+
+    def __init__(self):
+        self.user_session = SessaoFalsa()
+
+
+class RespostaStub:
+    """Imita a AIMessage do LangChain (conteúdo, uso de tokens e metadados)."""
+
+    def __init__(self, content, prompt_tokens, completion_tokens):
+        self.content = content
+        self.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens}
+        self.response_metadata = {"model_name": "stub"}
+
+
+def criar_provedor_stub(tamanho_resposta: int):
+    """
+    Cria o substituto de `cerebro.invocar_com_politica`: recebe as mensagens
+    já montadas por `pensar` e devolve uma resposta fixa, sem rede.
+    """
+    bloco = "Resposta simulada do GaMi para o perfilador. "
+
+    def invocar(llm, mensagens):
+        if isinstance(mensagens, bytes):  # Corpo JSON montado por Conversa.corpo_json
+            prompt_chars = len(mensagens)
+        else:
+            prompt_chars = sum(len(getattr(m, "content", "")) for m in mensagens)
+        texto = (bloco * (tamanho_resposta // len(bloco) + 1))[:tamanho_resposta]
+        return RespostaStub(texto, prompt_chars // 4, len(texto) // 4)
+
+    return invocar
+
+
+def preparar_ambiente(args):
+    """Isola banco/índices em um diretório temporário e importa o app com os stubs."""
+    diretorio = tempfile.mkdtemp(prefix="gami_perfil_")
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, raiz)
+    os.chdir(diretorio)
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-perfilador-local")
+    os.environ["AQUECIMENTO_ATIVO"] = "0"
+    os.environ["MEMORIA_ATIVA"] = "1" if args.memoria else "0"
+
+    import cerebro
+    cerebro.invocar_com_politica = criar_provedor_stub(args.tamanho_resposta)
+
+    import app
+    chainlit_falso = ChainlitFalso()
+    app.cl = chainlit_falso
+    # TTS local: devolve bytes do tamanho aproximado de uma fala real em opus
+    app.falar_texto_longo = lambda texto, metricas=None, **kwargs: (b"\0" * (len(texto) * 40), "opus")
+    print(f"📁 Ambiente temporário: {diretorio}")
+    return app, chainlit_falso
+
+
+def tamanho_rastreado() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def aguardar_background(chainlit_falso, espera: float):
+    """Espera as tarefas de áudio e dá tempo aos backups no executor."""
+    tarefas = chainlit_falso.user_session.get("tarefas_audio") or set()
+    if tarefas:
+        await asyncio.gather(*list(tarefas), return_exceptions=True)
+    await asyncio.sleep(espera)
+    app_modulo = sys.modules["app"]
+    app_modulo.registro_uso.descarregar()  # Grava o ledger pendente (senão conta como "retido")
+
+
+async def executar_sessao(app, chainlit_falso, indice: int, args, snapshots: list = None) -> dict:
+    """
+    Roda uma conversa sintética de `args.turnos` turnos.
+
+    Returns:
+        Dict com a memória viva no início e no fim da sessão
+    """
+    chainlit_falso.user_session = SessaoFalsa()
+    await app.start()
+    if args.voz:
+        chainlit_falso.user_session.set("modo_voz", True)
+
+    inicio = tamanho_rastreado()
+    for turno in range(1, args.turnos + 1):
+        texto = f"Sessão {indice}, pergunta {turno}: como organizar um projeto Python com testes e deploy?"
+        await app.processar_interacao(texto)
+        if snapshots is not None and turno % args.intervalo == 0:
+            await aguardar_background(chainlit_falso, 0)
+            snapshots.append((turno, tracemalloc.take_snapshot().filter_traces(FILTROS)))
+    await aguardar_background(chainlit_falso, args.espera)
+    fim = tamanho_rastreado()
+
+    # Encerra a sessão: tudo o que ficar depois disso é memória retida
+    chainlit_falso.user_session = SessaoFalsa()
+    return {"viva_inicio": inicio, "viva_fim": fim}
+
+
+def formatar_bytes(valor: float) -> str:
+    for unidade in ("B", "KiB", "MiB"):
+        if abs(valor) < 1024:
+            return f"{valor:.1f} {unidade}"
+        valor /= 1024
+    return f"{valor:.1f} GiB"
+
+
+async def perfilar(args) -> int:
+    app, chainlit_falso = preparar_ambiente(args)
+    tracemalloc.start(args.profundidade)
+
+    # Sessões de aquecimento: caches, pools e threads de fundo nascem aqui, fora da medição
+    # (o executor padrão cria threads e conexões aos poucos, então uma sessão só não basta)
+    for indice in range(args.aquecimento):
+        await executar_sessao(app, chainlit_falso, -indice, args)
+
+    base = tamanho_rastreado()
+    snapshot_base = tracemalloc.take_snapshot().filter_traces(FILTROS)
+    retidas = []
+    crescimento_vivo = []
+    snapshots = []
+    inicio = time.perf_counter()
+
+    for indice in range(1, args.sessoes + 1):
+        antes = tamanho_rastreado()
+        resultado = await executar_sessao(app, chainlit_falso, indice, args)
+        depois = tamanho_rastreado()
+        retidas.append(depois - antes)
+        crescimento_vivo.append((resultado["viva_fim"] - resultado["viva_inicio"]) / args.turnos)
+        print(
+            f"🧪 Sessão {indice}: viva {formatar_bytes(resultado['viva_fim'] - resultado['viva_inicio'])} "
+            f"| retida após encerrar {formatar_bytes(depois - antes)}"
+        )
+
+    final = tamanho_rastreado()
+    snapshot_final = tracemalloc.take_snapshot().filter_traces(FILTROS)
+    duracao = time.perf_counter() - inicio
+    total_turnos = args.sessoes * args.turnos
+    # Mediana: um vazamento precisa aparecer na maioria das sessões para passar
+    # despercebido; o enchimento de caches fica com o --aquecimento
+    retido_por_turno = statistics.median(retidas) / args.turnos
+    vivo_por_turno = statistics.median(crescimento_vivo)
+
+    # Sessão de diagnóstico, fora da medição (os snapshots também ocupam memória rastreada)
+    await executar_sessao(app, chainlit_falso, args.sessoes + 1, args, snapshots)
+
+    print(f"\n📈 Crescimento durante a sessão de diagnóstico (a cada {args.intervalo} turnos):")
+    anterior = snapshots[0][1] if snapshots else None
+    for turno, snap in snapshots[1:]:
+        delta = sum(s.size_diff for s in snap.compare_to(anterior, "filename"))
+        print(f"   turno {turno:>5}: {formatar_bytes(delta)} desde o snapshot anterior")
+        anterior = snap
+
+    print(f"\n🔝 Top {args.top} pontos de crescimento retido (após {args.sessoes} sessões encerradas):")
+    for estatistica in snapshot_final.compare_to(snapshot_base, "lineno")[:args.top]:
+        quadro = estatistica.traceback[0]
+        print(
+            f"   {formatar_bytes(estatistica.size_diff):>12} ({estatistica.count_diff:+} blocos) "
+            f"{quadro.filename}:{quadro.lineno}"
+        )
+
+    print(
+        f"\n📊 {total_turnos} turnos em {duracao:.1f}s | retida por sessão (média): "
+        f"{formatar_bytes(sum(retidas) / len(retidas))} | total retido: {formatar_bytes(final - base)}"
+    )
+    print(
+        f"   viva por turno (mediana): {formatar_bytes(vivo_por_turno)} "
+        f"(orçamento {formatar_bytes(args.orcamento_vivo)}) | retida por turno (mediana): "
+        f"{formatar_bytes(retido_por_turno)} (orçamento {formatar_bytes(args.orcamento)})"
+    )
+    tracemalloc.stop()
+
+    codigo = 0
+    if vivo_por_turno > args.orcamento_vivo:
+        print("❌ Crescimento da sessão aberta por turno acima do orçamento")
+        codigo = 1
+    if retido_por_turno > args.orcamento:
+        print("❌ Memória retida por turno acima do orçamento")
+        codigo = 1
+    if codigo == 0:
+        print("✅ Crescimento por turno dentro dos orçamentos")
+    return codigo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfila a memória de sessões longas do GaMi-AI")
+    parser.add_argument("--sessoes", type=int, default=3, help="Sessões medidas (uma após a outra)")
+    parser.add_argument("--turnos", type=int, default=100, help="Turnos por sessão")
+    parser.add_argument("--intervalo", type=int, default=25, help="Turnos entre snapshots")
+    parser.add_argument("--top", type=int, default=15, help="Quantidade de pontos no relatório")
+    parser.add_argument("--profundidade", type=int, default=10, help="Frames guardados por alocação")
+    parser.add_argument("--tamanho-resposta", type=int, default=600, help="Caracteres da resposta do stub")
+    parser.add_argument("--orcamento", type=float, default=2048,
+                        help="Bytes retidos por turno tolerados após as sessões encerrarem")
+    parser.add_argument("--orcamento-vivo", type=float, default=8192,
+                        help="Bytes por turno tolerados no crescimento da sessão enquanto aberta")
+    parser.add_argument("--aquecimento", type=int, default=3,
+                        help="Sessões descartadas antes da medição (pools e caches estabilizam)")
+    parser.add_argument("--espera", type=float, default=0.5,
+                        help="Segundos aguardando backups em background ao fim de cada sessão")
+    parser.add_argument("--voz", action="store_true", help="Simula sessões de voz (TTS em background)")
+    parser.add_argument("--memoria", action="store_true", help="Mantém a memória de longo prazo ativa")
+    args = parser.parse_args(argv)
+    return asyncio.run(perfilar(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
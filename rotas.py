@@ -0,0 +1,25 @@
+"""
+Rotas Extras - Registro de endpoints próprios no servidor FastAPI do Chainlit.
+
+O Chainlit tem uma rota "catch-all" para o frontend; rotas adicionadas
+depois dela nunca seriam alcançadas. Os módulos que expõem endpoints
+(saude.py, exportacao.py) registram suas rotas dentro de
+`rotas_antes_do_frontend`.
+"""
+from contextlib import contextmanager
+
+
+@contextmanager
+def rotas_antes_do_frontend(servidor):
+    """
+    Move para o início do roteador as rotas registradas dentro do bloco.
+
+    Args:
+        servidor: Aplicação FastAPI (chainlit.server.app)
+    """
+    quantidade_antes = len(servidor.router.routes)
+    yield
+    rotas = servidor.router.routes
+    novas = rotas[quantidade_antes:]
+    del rotas[quantidade_antes:]
+    rotas[0:0] = novas
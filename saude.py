@@ -0,0 +1,188 @@
+"""
+Saúde e Aquecimento - Mantém conexões quentes e expõe endpoints de readiness.
+
+No boot (e depois periodicamente) abre algumas conexões do banco e faz uma
+chamada barata aos endpoints do LLM e da voz, para que DNS, TLS e o pool de
+conexões já estejam prontos quando o primeiro usuário chegar. O resultado de
+cada sonda fica disponível em:
+
+    GET /healthz  - liveness: o processo está de pé (sempre 200), com a latência
+                    e os erros de cada dependência (banco, LLM, voz)
+    GET /readyz   - readiness: 200 depois do primeiro aquecimento, com o banco ok
+
+LLM e voz são serviços externos: uma queda curta do provedor (ou uma chave
+faltando) aparece como aviso no /healthz, mas não derruba a readiness, para a
+plataforma não reiniciar uma instância que não tem como se consertar sozinha.
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AQUECIMENTO_ATIVO = os.getenv("AQUECIMENTO_ATIVO", "1") == "1"
+AQUECIMENTO_INTERVALO = float(os.getenv("AQUECIMENTO_INTERVALO", "240"))  # Abaixo do idle timeout típico
+AQUECIMENTO_CONEXOES_DB = int(os.getenv("AQUECIMENTO_CONEXOES_DB", "3"))
+TIMEOUT_SONDA = float(os.getenv("SAUDE_TIMEOUT_SONDA", "5"))
+
+# Dependências que precisam estar ok para a instância receber tráfego
+DEPENDENCIAS_ESSENCIAIS = ("db",)
+
+ESTADO = {
+    "aquecido": False,
+    "iniciado_em": datetime.utcnow().isoformat(),
+    "dependencias": {},
+}
+_lock_estado = threading.Lock()
+_thread_aquecimento = None
+
+
+def _medir(nome: str, sonda):
+    """Executa uma sonda, registrando latência e erro (sem nunca levantar exceção)."""
+    inicio = time.perf_counter()
+    try:
+        sonda()
+        resultado = {"ok": True}
+    except Exception as e:
+        resultado = {"ok": False, "erro": str(e)[:200]}
+    resultado["latencia_ms"] = int((time.perf_counter() - inicio) * 1000)
+    resultado["verificado_em"] = datetime.utcnow().isoformat()
+    with _lock_estado:
+        ESTADO["dependencias"][nome] = resultado
+    return resultado
+
+
+def sonda_db():
+    """Abre algumas conexões ao mesmo tempo (aquece o pool) e faz SELECT 1 em cada."""
+    from database import engine
+
+    conexoes = []
+    try:
+        for _ in range(max(1, AQUECIMENTO_CONEXOES_DB)):
+            conexoes.append(engine.connect())
+        for conn in conexoes:
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conexoes:
+            conn.close()
+
+
+def sonda_llm():
+    """Lista os modelos pelo mesmo cliente HTTP usado em `pensar` (aquece DNS/TLS/pool)."""
+    from cerebro import criar_llm
+
+    criar_llm().root_client.with_options(timeout=TIMEOUT_SONDA, max_retries=0).models.list()
+
+
+def sonda_voz():
+    """Chamada barata ao endpoint de voz (OpenAI) pelo cliente compartilhado de voz.py."""
+    from voz import client
+
+    client.with_options(timeout=TIMEOUT_SONDA, max_retries=0).models.list()
+
+
+SONDAS = {
+    "db": sonda_db,
+    "llm": sonda_llm,
+    "voz": sonda_voz,
+}
+
+
+def aquecer() -> dict:
+    """
+    Executa todas as sondas em paralelo e atualiza o estado de readiness.
+
+    Returns:
+        Dict {dependencia: resultado}
+    """
+    threads = [
+        threading.Thread(target=_medir, args=(nome, sonda), daemon=True)
+        for nome, sonda in SONDAS.items()
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(TIMEOUT_SONDA * 3)
+
+    with _lock_estado:
+        ESTADO["aquecido"] = True
+        dependencias = dict(ESTADO["dependencias"])
+    resumo = " | ".join(
+        f"{nome}: {'ok' if r['ok'] else 'falhou'} ({r['latencia_ms']} ms)" for nome, r in dependencias.items()
+    )
+    print(f"🔥 Aquecimento: {resumo}")
+    return dependencias
+
+
+def _loop_aquecimento():
+    while True:
+        try:
+            aquecer()
+        except Exception as e:
+            print(f"⚠️ Erro no aquecimento: {e}")
+        time.sleep(AQUECIMENTO_INTERVALO)
+
+
+def iniciar_aquecimento():
+    """Inicia (uma única vez) o aquecimento no boot e o keep-alive periódico."""
+    global _thread_aquecimento
+    if not AQUECIMENTO_ATIVO:
+        with _lock_estado:
+            ESTADO["aquecido"] = True  # Sem sondas: /readyz depende só do processo estar de pé
+        return
+    if _thread_aquecimento is None:
+        _thread_aquecimento = threading.Thread(target=_loop_aquecimento, name="aquecimento", daemon=True)
+        _thread_aquecimento.start()
+
+
+def relatorio() -> dict:
+    """
+    Monta o relatório de saúde.
+
+    Returns:
+        Dict com status ("pronto", "aquecendo" ou "degradado"), as dependências
+        e os avisos (dependências não essenciais falhando, ex.: LLM fora do ar)
+    """
+    with _lock_estado:
+        dependencias = {nome: dict(r) for nome, r in ESTADO["dependencias"].items()}
+        aquecido = ESTADO["aquecido"]
+
+    if not aquecido:
+        status = "aquecendo"
+    elif not AQUECIMENTO_ATIVO or all(dependencias.get(nome, {}).get("ok") for nome in DEPENDENCIAS_ESSENCIAIS):
+        status = "pronto"
+    else:
+        status = "degradado"
+    avisos = sorted(
+        nome for nome, r in dependencias.items() if nome not in DEPENDENCIAS_ESSENCIAIS and not r.get("ok")
+    )
+    return {
+        "status": status,
+        "iniciado_em": ESTADO["iniciado_em"],
+        "dependencias": dependencias,
+        "avisos": avisos,
+    }
+
+
+def registrar_rotas(servidor):
+    """
+    Registra /healthz e /readyz no servidor FastAPI do Chainlit.
+
+    Args:
+        servidor: Aplicação FastAPI (chainlit.server.app)
+    """
+    from fastapi.responses import JSONResponse
+    from rotas import rotas_antes_do_frontend
+
+    with rotas_antes_do_frontend(servidor):
+        @servidor.get("/healthz")
+        async def healthz():
+            return JSONResponse(relatorio())
+
+        @servidor.get("/readyz")
+        async def readyz():
+            dados = relatorio()
+            return JSONResponse(dados, status_code=200 if dados["status"] == "pronto" else 503)
@@ -0,0 +1,240 @@
+"""
+Ledger de Uso - Tokens, voz e latências por turno, com agregados incrementais.
+
+Cada turno vira uma linha em `usage_turns`. As linhas são enfileiradas e
+gravadas em lote por uma thread de fundo, que no mesmo commit atualiza os
+agregados por perfil/hora (`usage_profile_hourly`) e por thread
+(`usage_threads`). Dashboards consultam só os agregados, nunca `messages`.
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import desc
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import ChatProfile, UsageTurn, UsageProfileHourly, UsageThread
+
+# Campos somados nos agregados
+CAMPOS_SOMA = ("prompt_tokens", "completion_tokens", "cached_tokens", "tts_chars", "stt_seconds")
+
+
+def inicio_da_hora(momento: datetime) -> datetime:
+    """Retorna o início da janela de uma hora que contém `momento`."""
+    return momento.replace(minute=0, second=0, microsecond=0)
+
+
+class RegistroUso:
+    """
+    Fila de gravação em lote do ledger de uso.
+
+    `registrar` nunca bloqueia o handler: só coloca o turno na fila. A thread
+    de fundo grava quando junta `tamanho_lote` linhas ou a cada
+    `intervalo` segundos, o que vier primeiro.
+    """
+
+    def __init__(self, tamanho_lote: int = 50, intervalo: float = 5.0):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.fila = queue.Queue()
+        self._perfis = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def registrar(self, metricas: dict):
+        """
+        Enfileira as métricas de um turno.
+
+        Args:
+            metricas: Dict com thread_id, perfil e os campos de UsageTurn
+        """
+        metricas = dict(metricas)
+        metricas.setdefault("created_at", datetime.utcnow())
+        self.fila.put(metricas)
+        self._iniciar()
+
+    def _iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="registro-uso", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            lote = self._coletar()
+            if lote:
+                self._gravar(lote)
+
+    def _coletar(self) -> list:
+        """Espera o primeiro item e junta o que chegar até encher o lote ou dar o intervalo."""
+        lote = [self.fila.get()]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def descarregar(self):
+        """Grava imediatamente tudo o que estiver na fila (usado no encerramento)."""
+        lote = []
+        while True:
+            try:
+                lote.append(self.fila.get_nowait())
+            except queue.Empty:
+                break
+        if lote:
+            self._gravar(lote)
+
+    def _id_perfil(self, db, perfil):
+        if not perfil:
+            return None
+        if perfil not in self._perfis:
+            p_obj = db.query(ChatProfile).filter(ChatProfile.name == perfil).first()
+            self._perfis[perfil] = p_obj.id if p_obj else None
+        return self._perfis[perfil]
+
+    def _gravar(self, lote: list, tentativa: int = 1):
+        db = None
+        try:
+            db = SessionLocal()
+            turnos = []
+            for m in lote:
+                turnos.append(UsageTurn(
+                    thread_id=m.get("thread_id"),
+                    profile_id=self._id_perfil(db, m.get("perfil")),
+                    model=m.get("model"),
+                    prompt_tokens=m.get("prompt_tokens", 0),
+                    completion_tokens=m.get("completion_tokens", 0),
+                    cached_tokens=m.get("cached_tokens", 0),
+                    tts_chars=m.get("tts_chars", 0),
+                    stt_seconds=m.get("stt_seconds", 0.0),
+                    latency_stt_ms=m.get("latency_stt_ms"),
+                    latency_llm_ms=m.get("latency_llm_ms"),
+                    latency_tts_ms=m.get("latency_tts_ms"),
+                    latency_total_ms=m.get("latency_total_ms"),
+                    created_at=m["created_at"],
+                ))
+            db.add_all(turnos)
+            self._atualizar_agregados(db, turnos)
+            db.commit()
+        except IntegrityError:
+            # Outro worker criou o mesmo agregado ao mesmo tempo: repete como update
+            if db:
+                db.rollback()
+            if tentativa < 3:
+                self._gravar(lote, tentativa + 1)
+        except Exception as e:
+            if db:
+                db.rollback()
+            print(f"⚠️ Erro ao gravar ledger de uso ({len(lote)} turnos): {e}")
+        finally:
+            if db:
+                db.close()
+
+    def _atualizar_agregados(self, db, turnos: list):
+        """
+        Soma o lote em memória e aplica uma única atualização por chave de agregado.
+        """
+        por_perfil = {}
+        por_thread = {}
+        for t in turnos:
+            chave = (inicio_da_hora(t.created_at), t.profile_id, t.model)
+            por_perfil.setdefault(chave, []).append(t)
+            if t.thread_id:
+                por_thread.setdefault(t.thread_id, []).append(t)
+
+        for (bucket, profile_id, model), grupo in por_perfil.items():
+            agg = db.query(UsageProfileHourly).filter(
+                UsageProfileHourly.bucket == bucket,
+                UsageProfileHourly.profile_id == profile_id,
+                UsageProfileHourly.model == model,
+            ).first()
+            if not agg:
+                agg = UsageProfileHourly(bucket=bucket, profile_id=profile_id, model=model)
+                db.add(agg)
+            _somar(agg, grupo)
+
+        for thread_id, grupo in por_thread.items():
+            agg = db.get(UsageThread, thread_id)
+            if not agg:
+                agg = UsageThread(thread_id=thread_id, profile_id=grupo[0].profile_id)
+                db.add(agg)
+            _somar(agg, grupo)
+            agg.updated_at = max(t.created_at for t in grupo)
+
+
+def _somar(agg, grupo: list):
+    """Acumula um grupo de turnos em uma linha de agregado."""
+    # Linhas só de voz (ex.: botão "Ouvir") não contam como turno do modelo
+    agg.turns = (agg.turns or 0) + sum(1 for t in grupo if t.model)
+    for campo in CAMPOS_SOMA:
+        total = sum(getattr(t, campo) or 0 for t in grupo)
+        setattr(agg, campo, (getattr(agg, campo) or 0) + total)
+    latencias = [t.latency_total_ms for t in grupo if t.latency_total_ms is not None]
+    if latencias:
+        agg.latency_total_ms_sum = (agg.latency_total_ms_sum or 0) + sum(latencias)
+        agg.latency_total_ms_max = max(agg.latency_total_ms_max or 0, max(latencias))
+
+
+# Instância única do processo
+registro_uso = RegistroUso(
+    tamanho_lote=int(os.getenv("USO_TAMANHO_LOTE", "50")),
+    intervalo=float(os.getenv("USO_INTERVALO_FLUSH", "5")),
+)
+atexit.register(registro_uso.descarregar)
+
+
+def uso_por_perfil(db, horas: int = 24) -> list:
+    """
+    Consumo por perfil nas últimas `horas`, lido só dos agregados horários.
+
+    Returns:
+        Lista de dicts ordenada por tokens totais (maior primeiro)
+    """
+    desde = inicio_da_hora(datetime.utcnow() - timedelta(hours=horas))
+    linhas = db.query(UsageProfileHourly, ChatProfile.name).outerjoin(
+        ChatProfile, ChatProfile.id == UsageProfileHourly.profile_id
+    ).filter(UsageProfileHourly.bucket >= desde).all()
+
+    totais = {}
+    for agg, nome in linhas:
+        item = totais.setdefault(nome or "desconhecido", {"perfil": nome or "desconhecido", "turns": 0,
+                                                          "latency_total_ms_sum": 0,
+                                                          **{c: 0 for c in CAMPOS_SOMA}})
+        item["turns"] += agg.turns or 0
+        item["latency_total_ms_sum"] += agg.latency_total_ms_sum or 0
+        for campo in CAMPOS_SOMA:
+            item[campo] += getattr(agg, campo) or 0
+
+    for item in totais.values():
+        item["latencia_media_ms"] = round(item.pop("latency_total_ms_sum") / item["turns"]) if item["turns"] else None
+    return sorted(totais.values(), key=lambda i: i["prompt_tokens"] + i["completion_tokens"], reverse=True)
+
+
+def threads_mais_lentas(db, limite: int = 20) -> list:
+    """
+    Threads com maior latência média por turno, lidas do agregado por thread.
+
+    Returns:
+        Lista de dicts {thread_id, turns, latencia_media_ms, latencia_max_ms}
+    """
+    media = UsageThread.latency_total_ms_sum / UsageThread.turns
+    linhas = db.query(UsageThread).filter(UsageThread.turns > 0).order_by(desc(media)).limit(limite).all()
+    return [
+        {
+            "thread_id": agg.thread_id,
+            "turns": agg.turns,
+            "latencia_media_ms": round(agg.latency_total_ms_sum / agg.turns),
+            "latencia_max_ms": agg.latency_total_ms_max,
+        }
+        for agg in linhas
+    ]
@@ -2,7 +2,11 @@
 Módulo de Voz - Whisper (Transcrição) e OpenAI TTS (Fala)
 """
 import os
+import re
+import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -12,13 +16,55 @@ load_dotenv()
 # Inicializar cliente OpenAI
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Formato de saída da fala. opus/aac já saem em bitrate de voz e são bem menores
+# que mp3; a API da OpenAI não permite escolher o bitrate, só o codec.
+FORMATOS_AUDIO = {
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+}
+FORMATO_PADRAO = os.getenv("TTS_FORMATO", "opus").lower()
+if FORMATO_PADRAO not in FORMATOS_AUDIO:
+    FORMATO_PADRAO = "opus"
 
-def transcrever(audio_file_path: str) -> str:
+# Formatos cujos arquivos podem ser concatenados byte a byte (fluxo de frames)
+FORMATOS_CONCATENAVEIS = {"mp3", "aac"}
+
+# Respostas de vários trechos viram um único áudio, então precisam de um
+# formato concatenável (opus/ogg não pode ser emendado byte a byte); aac
+# (ADTS) é o mais compacto entre eles
+FORMATO_LONGO = os.getenv("TTS_FORMATO_LONGO", "aac").lower()
+if FORMATO_LONGO not in FORMATOS_CONCATENAVEIS:
+    FORMATO_LONGO = "aac"
+
+# Textos longos são divididos em trechos sintetizados em paralelo. Todos os
+# trechos rodam ao mesmo tempo, até o teto TTS_CONCORRENCIA (~7.000 caracteres
+# com os padrões); acima disso os trechos restantes esperam vaga
+TAMANHO_TRECHO = int(os.getenv("TTS_TAMANHO_TRECHO", "600"))
+CONCORRENCIA_TTS = int(os.getenv("TTS_CONCORRENCIA", "12"))
+
+# Bytes gerados por formato (respostas, bytes, caracteres) desde o início do processo
+ESTATISTICAS_AUDIO = {}
+_lock_estatisticas = threading.Lock()
+
+
+def _registrar_estatistica(formato: str, num_bytes: int, num_caracteres: int):
+    with _lock_estatisticas:
+        est = ESTATISTICAS_AUDIO.setdefault(formato, {"respostas": 0, "bytes": 0, "caracteres": 0})
+        est["respostas"] += 1
+        est["bytes"] += num_bytes
+        est["caracteres"] += num_caracteres
+
+
+def transcrever(audio_file_path: str, metricas: dict = None) -> str:
     """
     Transcreve um arquivo de áudio usando Whisper.
     
     Args:
         audio_file_path: Caminho para o arquivo de áudio
+        metricas: Dict opcional preenchido com a duração do áudio (stt_seconds)
         
     Returns:
         Texto transcrito
@@ -28,17 +74,179 @@ def transcrever(audio_file_path: str) -> str:
             transcript = client.audio.transcriptions.create(
                 model="whisper-1",
                 file=audio_file,
-                language="pt"  # Português
+                language="pt",  # Português
+                response_format="verbose_json"  # Inclui a duração (cobrada por segundo)
             )
+        if metricas is not None:
+            metricas["stt_seconds"] = float(getattr(transcript, "duration", 0) or 0)
         return transcript.text
     except Exception as e:
         raise Exception(f"Erro ao transcrever áudio: {str(e)}")
 
 
+def mime_do_formato(formato: str = None) -> str:
+    """Retorna o MIME type correspondente ao formato de áudio."""
+    return FORMATOS_AUDIO.get(formato or FORMATO_PADRAO, "audio/mpeg")
+
+
+def falar_bytes(texto: str, voz: str = "onyx", formato: str = None) -> bytes:
+    """
+    Converte texto em fala usando OpenAI TTS, sem tocar no disco.
+    
+    Args:
+        texto: Texto a ser convertido em fala
+        voz: Voz a ser usada (alloy, echo, fable, onyx, nova, shimmer)
+        formato: Codec de saída (opus, aac, mp3, flac, wav). Padrão: TTS_FORMATO
+        
+    Returns:
+        Bytes do áudio no formato pedido
+    """
+    formato = formato or FORMATO_PADRAO
+    try:
+        response = client.audio.speech.create(
+            model="tts-1",
+            voice=voz,
+            input=texto,
+            response_format=formato
+        )
+        audio = b"".join(response.iter_bytes())
+        _registrar_estatistica(formato, len(audio), len(texto))
+        return audio
+    except Exception as e:
+        raise Exception(f"Erro ao gerar fala: {str(e)}")
+
+
+def medir_formatos(texto: str, formatos: list = None) -> dict:
+    """
+    Gera a mesma fala em vários formatos e compara o tamanho de cada um.
+    
+    Args:
+        texto: Texto de referência
+        formatos: Lista de formatos (padrão: todos os suportados)
+        
+    Returns:
+        Dict {formato: {"bytes", "bytes_por_caractere"}}
+    """
+    resultado = {}
+    for formato in formatos or list(FORMATOS_AUDIO):
+        num_bytes = len(falar_bytes(texto, formato=formato))
+        resultado[formato] = {
+            "bytes": num_bytes,
+            "bytes_por_caractere": round(num_bytes / max(1, len(texto)), 1),
+        }
+    return resultado
+
+
+def preparar_texto_fala(texto: str) -> str:
+    """
+    Remove markdown e blocos de código antes da síntese.
+    
+    Blocos de código viram um aviso curto (ler código em voz alta não ajuda
+    ninguém) e a marcação (títulos, negrito, links, tabelas) é descartada.
+    
+    Args:
+        texto: Resposta em markdown
+        
+    Returns:
+        Texto limpo para ser falado
+    """
+    texto = re.sub(r"```.*?(```|$)", "\n(trecho de código omitido)\n", texto, flags=re.DOTALL)
+    texto = re.sub(r"`([^`]*)`", r"\1", texto)
+    texto = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", texto)
+    texto = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", texto)
+    texto = re.sub(r"https?://\S+", "link", texto)
+    texto = re.sub(r"^[ \t]*(#{1,6}|>)[ \t]*", "", texto, flags=re.MULTILINE)
+    texto = re.sub(r"^[ \t]*([-*+]|\d+[.)])[ \t]+", "", texto, flags=re.MULTILINE)
+    texto = re.sub(r"^[ \t]*\|?[ \t:|-]+\|[ \t:|-]*$", "", texto, flags=re.MULTILINE)
+    texto = re.sub(r"^[ \t]*\|(.*?)\|?[ \t]*$", r"\1", texto, flags=re.MULTILINE)
+    texto = re.sub(r"[ \t]*\|[ \t]*", ", ", texto)
+    texto = re.sub(r"\*\*|__|\*|~~|(?<!\w)_|_(?!\w)", "", texto)
+    texto = re.sub(r"[ \t]+", " ", texto)
+    texto = re.sub(r"\n{3,}", "\n\n", texto)
+    return texto.strip()
+
+
+def dividir_para_fala(texto: str, limite: int = None) -> list:
+    """
+    Divide o texto em trechos de até `limite` caracteres.
+    
+    Respeita parágrafos e frases; só quebra no meio de uma frase (em vírgulas
+    ou espaços) quando ela sozinha ultrapassa o limite.
+    
+    Args:
+        texto: Texto já limpo (ver `preparar_texto_fala`)
+        limite: Tamanho máximo de cada trecho (padrão: TTS_TAMANHO_TRECHO)
+        
+    Returns:
+        Lista de trechos, na ordem de leitura
+    """
+    limite = limite or TAMANHO_TRECHO
+    frases = []
+    for paragrafo in re.split(r"\n\s*\n", texto):
+        for frase in re.split(r"(?<=[.!?…:;])\s+", paragrafo.strip()):
+            while len(frase) > limite:
+                corte = max(frase.rfind(", ", 0, limite), frase.rfind(" ", 0, limite))
+                corte = corte + 1 if corte > 0 else limite
+                frases.append(frase[:corte].strip())
+                frase = frase[corte:].strip()
+            if frase:
+                frases.append(frase)
+
+    trechos = []
+    atual = ""
+    for frase in frases:
+        if atual and len(atual) + 1 + len(frase) > limite:
+            trechos.append(atual)
+            atual = frase
+        else:
+            atual = f"{atual} {frase}" if atual else frase
+    if atual:
+        trechos.append(atual)
+    return trechos
+
+
+def falar_texto_longo(texto: str, voz: str = "onyx", formato: str = None, metricas: dict = None) -> tuple:
+    """
+    Gera a fala de uma resposta de qualquer tamanho como um único áudio.
+    
+    O texto é limpo e dividido em trechos, e todos os trechos são sintetizados
+    em paralelo (até TTS_CONCORRENCIA), então a latência total fica próxima à
+    do trecho mais lento. Os trechos são emendados em um único áudio; se o
+    formato pedido não for concatenável (opus), respostas de vários trechos
+    saem em TTS_FORMATO_LONGO.
+    
+    Args:
+        texto: Resposta do assistente (markdown)
+        voz: Voz a ser usada
+        formato: Codec de saída (padrão: TTS_FORMATO)
+        metricas: Dict opcional preenchido com os caracteres sintetizados (tts_chars)
+        
+    Returns:
+        Tupla (bytes do áudio ou None se não houver o que falar, formato usado)
+    """
+    formato = formato or FORMATO_PADRAO
+    trechos = dividir_para_fala(preparar_texto_fala(texto))
+    if metricas is not None:
+        metricas["tts_chars"] = sum(len(trecho) for trecho in trechos)
+    if not trechos:
+        return None, formato
+    if len(trechos) == 1:
+        return falar_bytes(trechos[0], voz, formato), formato
+
+    if formato not in FORMATOS_CONCATENAVEIS:
+        formato = FORMATO_LONGO
+    with ThreadPoolExecutor(max_workers=min(CONCORRENCIA_TTS, len(trechos))) as executor:
+        partes = list(executor.map(lambda trecho: falar_bytes(trecho, voz, formato), trechos))
+    return b"".join(partes), formato
+
+
 def falar(texto: str, voz: str = "onyx") -> str:
     """
     Converte texto em fala usando OpenAI TTS e salva o arquivo.
     
+    Mantido para scripts que precisam de um arquivo; a aplicação web usa
+    `falar_bytes` e passa os bytes direto para o elemento de áudio.
+    
     Args:
         texto: Texto a ser convertido em fala
         voz: Voz a ser usada (alloy, echo, fable, onyx, nova, shimmer)
@@ -56,21 +264,18 @@ def falar(texto: str, voz: str = "onyx") -> str:
         audio_filename = f"tts_{uuid.uuid4().hex[:8]}.mp3"
         audio_path = audio_dir / audio_filename
         
-        # Gerar áudio usando OpenAI TTS
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voz,
-            input=texto,
-            response_format="mp3"
-        )
-        
         # Salvar arquivo
         with open(audio_path, "wb") as f:
-            for chunk in response.iter_bytes():
-                f.write(chunk)
+            f.write(falar_bytes(texto, voz, formato="mp3"))
         
         # Retornar caminho absoluto
         return str(audio_path.absolute())
     except Exception as e:
         raise Exception(f"Erro ao gerar fala: {str(e)}")
 
+
+if __name__ == "__main__":
+    # Compara o tamanho da mesma fala em cada formato: python voz.py "texto"
+    texto_teste = " ".join(sys.argv[1:]) or "Olá! Eu sou o GaMi-AI, seu assistente polímata."
+    for fmt, medida in medir_formatos(texto_teste).items():
+        print(f"{fmt:>5}: {medida['bytes']:>8} bytes ({medida['bytes_por_caractere']} bytes/caractere)")